@@ -1,3 +1,5 @@
+import time
+BOOT = time.perf_counter()  # the startup report counts from here, so it includes the imports below
 import discord
 from discord.ext import commands, tasks
 import logging
@@ -6,15 +8,29 @@ import os
 import random
 from itertools import cycle
 import asyncio
+from services import setup_logging, CommandLimiter
 
 # =======================
 # Logging Setup
 # =======================
-logging.basicConfig(
-    handlers=[logging.FileHandler(filename="discord.log", encoding="utf-8", mode="w")],
-    format="%(asctime)s:%(levelname)s:%(name)s: %(message)s",
-    level=logging.DEBUG
-)
+# Records are queued here and written by a background thread; see services/log_pipeline.py for the LOG_* settings
+log_listener = setup_logging()
+
+# =======================
+# Startup Timing
+# =======================
+startup_phases = {}  # phase -> seconds, in order
+_phase_start = BOOT
+
+def phase_done(name):
+    global _phase_start
+    now = time.perf_counter()
+    startup_phases[name] = now - _phase_start
+    _phase_start = now
+
+def startup_report():
+    total = sum(startup_phases.values())
+    return " | ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_phases.items()) + f" | total {total:.2f}s"
 
 # =======================
 # Load Environment
@@ -22,6 +38,11 @@ logging.basicConfig(
 load_dotenv()
 token = os.getenv("DISCORD_TOKEN")
 
+# Sharding: leave both unset to let Discord pick the shard count and run every shard here.
+# To split across processes, give each one the same SHARD_COUNT and its own SHARD_IDS (e.g. "0,1").
+SHARD_COUNT = int(os.getenv("SHARD_COUNT")) if os.getenv("SHARD_COUNT") else None
+SHARD_IDS = [int(i) for i in os.getenv("SHARD_IDS").split(",")] if os.getenv("SHARD_IDS") else None
+
 DEFAULT_COLOR = 0x4c00b0
 
 # =======================
@@ -34,12 +55,86 @@ class EmbedHelp(commands.MinimalHelpCommand):
             embed.add_field(name="\u200b", value=page, inline=False)
         await self.get_destination().send(embed=embed)
 
+# =======================
+# Command Rate Limits
+# =======================
+PREFIX = "?"
+# Token buckets: refill rate (tokens/s) and burst size, per user and per guild
+USER_RATE = float(os.getenv("CMD_USER_RATE", "0.5"))
+USER_BURST = float(os.getenv("CMD_USER_BURST", "5"))
+GUILD_RATE = float(os.getenv("CMD_GUILD_RATE", "3"))
+GUILD_BURST = float(os.getenv("CMD_GUILD_BURST", "20"))
+# At most one "slow down" reply per user/guild in this many seconds
+REJECT_REPLY_WINDOW = float(os.getenv("CMD_REJECT_REPLY_WINDOW", "10"))
+# Commands that start extractions or API calls cost more than the default 1
+# (keyed by command name, so aliases cost the same)
+COMMAND_COST = {"play": 3, "lyrics": 2, "radio": 2}
+
+limiter = CommandLimiter(
+    user_rate=USER_RATE, user_burst=USER_BURST,
+    guild_rate=GUILD_RATE, guild_burst=GUILD_BURST,
+    reply_window=REJECT_REPLY_WINDOW,
+)
+
+def invoked_command(content):
+    """The command a prefixed message would invoke, or None for chat like "?" or "?? lol"."""
+    rest = content[len(PREFIX):]
+    if not rest or rest[0].isspace():
+        return None
+    return kz.all_commands.get(rest.split(maxsplit=1)[0])
+
+class RateLimited(commands.CheckFailure):
+    """A slash invocation refused by the limiter; the user was already told (ephemerally)."""
+
+def limited_embed(scope, retry_after):
+    who = "You are" if scope == "user" else "This server is"
+    return discord.Embed(description=f"⏳ {who} sending commands too fast. Try again in {retry_after:.1f}s.", color=DEFAULT_COLOR)
+
+# =======================
+# Intents / Member Cache
+# =======================
+# Only what the bot reads: guild/channel data, voice states for music, prefix commands,
+# and members for assign/removerole. No presences, so no presence update stream.
+intents = discord.Intents.none()
+intents.guilds = True
+intents.voice_states = True
+intents.messages = True
+intents.message_content = True
+intents.members = True
+
+# Keep only members sitting in voice (the music cog checks author.voice). Everyone else
+# is fetched on demand instead of chunking every guild at startup.
+member_cache_flags = discord.MemberCacheFlags.none()
+member_cache_flags.voice = True
+
+async def get_or_fetch_member(guild, user_id):
+    """Cached member if there is one, otherwise a single REST fetch; None if they left."""
+    member = guild.get_member(user_id)
+    if member is not None:
+        return member
+    try:
+        return await guild.fetch_member(user_id)
+    except discord.NotFound:
+        return None
+
+def role_problem(ctx, role):
+    """Why the author may not hand out or take away `role`, mirroring Discord's own hierarchy rules; None if they may."""
+    if role >= ctx.guild.me.top_role or role.managed or role.is_default():
+        return f"⚠️ I can't manage {role.mention}."
+    if ctx.author.id != ctx.guild.owner_id and role >= ctx.author.top_role:
+        return f"⚠️ {role.mention} is not below your highest role."
+    return None
+
 # =======================
 # Bot Init
 # =======================
-kz = commands.Bot(
-    command_prefix='?',
-    intents=discord.Intents.all(),
+kz = commands.AutoShardedBot(
+    command_prefix=PREFIX,
+    shard_count=SHARD_COUNT,
+    shard_ids=SHARD_IDS,
+    intents=intents,
+    member_cache_flags=member_cache_flags,
+    chunk_guilds_at_startup=False,
     help_command=EmbedHelp()
 )
 
@@ -56,7 +151,7 @@ bot_status = cycle([
 for cmd_name in [
     "join","connect","joinvc","play","p","pause","resume","skip","queue","remove",
     "move","disconnect","leave","lyrics","loop","shuffle","clearqueue","nowplaying",
-    "pitch","speed","removedupes"
+    "seek","pitch","speed","removedupes","radio"
 ]:
     if kz.get_command(cmd_name):
         kz.remove_command(cmd_name)
@@ -66,27 +161,78 @@ for cmd_name in [
 # =======================
 @tasks.loop(seconds=30)
 async def change_status():
-    await kz.change_presence(activity=discord.Game(next(bot_status)))
+    activity = discord.Game(next(bot_status))
+    # One presence update per shard, so a shard that is reconnecting doesn't fail the others
+    for shard in kz.shards.values():
+        if shard.is_closed():
+            continue
+        try:
+            await shard.change_presence(activity=activity)
+        except Exception as e:
+            logging.warning("Presence update failed on shard %s: %s", shard.id, e)
+
+@kz.event
+async def on_connect():
+    if "gateway" not in startup_phases:
+        phase_done("gateway")
 
 @kz.event
 async def on_ready():
+    first = "on_ready" not in startup_phases
+    if first:
+        phase_done("guilds")  # READY plus guild streaming (member chunking is off, see intents)
     print(f"✅ Logged in as {kz.user} (ID: {kz.user.id})")
     print("Loaded commands:")
     for cmd in kz.commands:
         print(f"- {cmd.name} (aliases: {getattr(cmd, 'aliases', [])})")
-    change_status.start()
+    print(f"Shards: {sorted(kz.shards)} of {kz.shard_count}")
+    # on_ready fires again after a full reconnect
+    if not change_status.is_running():
+        change_status.start()
+    if first:
+        phase_done("on_ready")
+        print(f"⏱ Startup: {startup_report()}")
+        logging.info("Startup: %s", startup_report())
 
 @kz.event
 async def on_command_error(ctx, error):
+    if isinstance(error, RateLimited):
+        return
     embed = discord.Embed(description=f"❌ Error: {str(error)}", color=DEFAULT_COLOR)
     await ctx.send(embed=embed)
 
 @kz.event
 async def on_message(message):
-    if message.author == kz.user:
+    # Cheap filter first: most chat never starts with the prefix, and bots can't run commands anyway
+    if not message.content.startswith(PREFIX) or message.author.bot:
+        return
+    # Only real commands are charged; plain chat that happens to start with "?" never touches the buckets
+    command = invoked_command(message.content)
+    if command is None:
+        return
+    guild_id = message.guild.id if message.guild else None
+    limited = limiter.check(message.author.id, guild_id, COMMAND_COST.get(command.name, 1))
+    if limited:
+        retry_after, scope = limited
+        key = message.author.id if scope == "user" else guild_id
+        if limiter.should_reply(scope, key):
+            await message.reply(embed=limited_embed(scope, retry_after), mention_author=False)
         return
     await kz.process_commands(message)
 
+@kz.check
+async def slash_rate_limit(ctx):
+    # Prefix commands were already admitted in on_message; slash invocations never pass through it
+    if ctx.interaction is None:
+        return True
+    name = (ctx.command.root_parent or ctx.command).name
+    limited = limiter.check(ctx.author.id, ctx.guild.id if ctx.guild else None, COMMAND_COST.get(name, 1))
+    if limited:
+        retry_after, scope = limited
+        await ctx.interaction.response.send_message(embed=limited_embed(scope, retry_after), ephemeral=True)
+        raise RateLimited()
+    return True
+
 # =======================
 # General Commands
 # =======================
@@ -95,27 +241,89 @@ async def hello(ctx):
     embed = discord.Embed(description=f"Hello, {ctx.author.mention}!", color=DEFAULT_COLOR)
     await ctx.send(embed=embed)
 
-# Other utility commands like ping, purge, assign, removerole, etc. remain here
+@kz.command()
+async def shards(ctx):
+    music = kz.get_cog("Music")
+    embed = discord.Embed(title=f"🛰 Shards ({len(kz.shards)} of {kz.shard_count})", color=DEFAULT_COLOR)
+    for shard_id, shard in sorted(kz.shards.items()):
+        guilds = sum(1 for g in kz.guilds if g.shard_id == shard_id)
+        players = len(music.shard_players(shard_id)) if music else 0
+        latency = "offline" if shard.is_closed() else f"{shard.latency * 1000:.0f} ms"
+        marker = " (this server)" if ctx.guild and ctx.guild.shard_id == shard_id else ""
+        embed.add_field(
+            name=f"Shard {shard_id}{marker}",
+            value=f"Latency: {latency}\nGuilds: {guilds}\nPlayers: {players}",
+            inline=True
+        )
+    embed.set_footer(text="Made by Isho")
+    await ctx.send(embed=embed)
+
+@kz.command()
+@commands.guild_only()
+@commands.has_permissions(manage_roles=True)
+async def assign(ctx, user: discord.User, *, role: discord.Role):
+    problem = role_problem(ctx, role)
+    if problem:
+        return await ctx.send(embed=discord.Embed(description=problem, color=DEFAULT_COLOR))
+    member = await get_or_fetch_member(ctx.guild, user.id)
+    if member is None:
+        return await ctx.send(embed=discord.Embed(description="⚠️ That user is not in this server.", color=DEFAULT_COLOR))
+    await member.add_roles(role)
+    await ctx.send(embed=discord.Embed(description=f"✅ Gave {role.mention} to {member.mention}.", color=DEFAULT_COLOR))
+
+@kz.command()
+@commands.guild_only()
+@commands.has_permissions(manage_roles=True)
+async def removerole(ctx, user: discord.User, *, role: discord.Role):
+    problem = role_problem(ctx, role)
+    if problem:
+        return await ctx.send(embed=discord.Embed(description=problem, color=DEFAULT_COLOR))
+    member = await get_or_fetch_member(ctx.guild, user.id)
+    if member is None:
+        return await ctx.send(embed=discord.Embed(description="⚠️ That user is not in this server.", color=DEFAULT_COLOR))
+    await member.remove_roles(role)
+    await ctx.send(embed=discord.Embed(description=f"✅ Removed {role.mention} from {member.mention}.", color=DEFAULT_COLOR))
+
+@kz.command(hidden=True)
+@commands.is_owner()
+async def sync(ctx, guild_only: bool = False):
+    """Publishes the slash commands; with guild_only, to this server only (instant, for testing)."""
+    if guild_only and ctx.guild:
+        kz.tree.copy_global_to(guild=ctx.guild)
+        synced = await kz.tree.sync(guild=ctx.guild)
+    else:
+        synced = await kz.tree.sync()
+    await ctx.send(embed=discord.Embed(description=f"✅ Synced {len(synced)} slash commands.", color=DEFAULT_COLOR))
 
 # =======================
 # Cog Loader
 # =======================
 async def load():
-    for filename in os.listdir("./cogs"):
-        if filename.endswith(".py"):
-            try:
-                await kz.load_extension(f"cogs.{filename[:-3]}")
-                print(f"✅ Loaded cog: {filename}")
-            except Exception as e:
-                print(f"❌ Failed to load cog {filename}: {e}")
+    async def load_one(filename):
+        started = time.perf_counter()
+        try:
+            await kz.load_extension(f"cogs.{filename[:-3]}")
+            print(f"✅ Loaded cog: {filename} ({time.perf_counter() - started:.2f}s)")
+        except Exception as e:
+            print(f"❌ Failed to load cog {filename}: {e}")
+
+    # Cogs are independent; their async setup (cog_load) overlaps instead of running back to back
+    await asyncio.gather(*(load_one(f) for f in sorted(os.listdir("./cogs")) if f.endswith(".py")))
 
 # =======================
 # Main Entrypoint
 # =======================
 async def main():
+    phase_done("imports")
     async with kz:
         await load()
-        await kz.start(token)
+        phase_done("cogs")
+        await kz.login(token)
+        phase_done("login")
+        await kz.connect()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    try:
+        asyncio.run(main())
+    finally:
+        log_listener.stop()  # flushes whatever is still queued
@@ -0,0 +1,519 @@
+"""
+Offline benchmarks for the music cog.
+
+Runs the real Music cog against a fake bot/guild/channel, a fake voice client
+that pulls AudioSource.read() frames on a 20 ms clock (and Opus-encodes PCM like
+discord.py does), a stub extractor that answers with canned yt-dlp payloads
+pointing at a local test file, and a stub Spotify client. Needs discord.py and
+ffmpeg; no Discord connection, no YouTube.
+
+    python bench/music_bench.py --report bench.json
+    python bench/music_bench.py --baseline bench.json   # exits 1 on regressions
+
+Measured:
+  enqueue     Spotify playlist import into a player queue (tracks/s)
+  queue_ops   remove/move/shuffle/dedupe on a large queue
+  stream_cpu  CPU per 20 ms frame of a YTDLSource (python side and ffmpeg)
+  audio_cache one play into an empty cache is committed and replays from disk (exits 1 if not)
+  guilds      how many simulated guilds play in real time before frames run late
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKDIR = tempfile.mkdtemp(prefix="kz-bench-")
+# Configure the cog before it's imported: throwaway caches, no metrics endpoint, no audio cache,
+# no real API clients, and no loudness analyses competing with the playback being measured
+for name in ("EXTRACTION_CACHE_PATH", "PLAYER_STATE_PATH", "LOUDNESS_CACHE_PATH", "LYRICS_CACHE_PATH"):
+    os.environ[name] = os.path.join(WORKDIR, name.lower().replace("_path", ".sqlite3"))
+for name in ("GENIUS_TOKEN", "SPOTIFY_CLIENT_ID", "SPOTIFY_CLIENT_SECRET"):
+    os.environ.pop(name, None)
+os.environ["MUSIC_LOUDNESS_NORMALIZE"] = "0"
+os.environ["AUDIO_CACHE_MAX_BYTES"] = "0"
+os.environ["METRICS_PORT"] = "0"
+sys.path.insert(0, ROOT)
+
+import discord  # noqa: E402
+import cogs.Musicplayer as mp  # noqa: E402
+
+FRAME = 0.02
+# Lower is better unless listed in HIGHER_IS_BETTER
+COMPARED = (
+    "enqueue.us_per_track",
+    "queue_ops.remove_us",
+    "queue_ops.move_us",
+    "queue_ops.shuffle_ms",
+    "queue_ops.dedupe_ms",
+    "stream_cpu.pcm.python_us_per_frame",
+    "stream_cpu.opus.python_us_per_frame",
+    "guilds.sustained",
+)
+HIGHER_IS_BETTER = {"guilds.sustained"}
+
+# ==========================
+# Test Audio
+# ==========================
+def make_test_audio(ffmpeg, seconds):
+    """Writes a stereo 48 kHz tone; Opus in WebM when ffmpeg has libopus, else WAV. Returns (path, acodec)."""
+    base = ["-y", "-loglevel", "error", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}", "-ac", "2", "-ar", "48000"]
+    path = os.path.join(WORKDIR, "tone.webm")
+    if subprocess.run([ffmpeg, *base, "-c:a", "libopus", "-b:a", "128k", path]).returncode == 0:
+        return path, "opus"
+    path = os.path.join(WORKDIR, "tone.wav")
+    subprocess.run([ffmpeg, *base, "-c:a", "pcm_s16le", path], check=True)
+    return path, "pcm_s16le"
+
+# ==========================
+# Stubs
+# ==========================
+class StubExtractor:
+    """Stands in for ExtractionService: canned info dicts pointing at the local test file."""
+    def __init__(self, path, acodec, duration, *, latency=0.0):
+        self.path = path
+        self.acodec = acodec
+        self.duration = duration
+        self.latency = latency
+        self.waiting = 0
+        self.calls = 0
+
+    async def extract(self, query):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        video_id = hashlib.sha1(query.encode()).hexdigest()[:11]
+        return {
+            "id": video_id,
+            "title": f"Bench {query}",
+            "webpage_url": f"https://www.youtube.com/watch?v={video_id}",
+            "duration": self.duration,
+            "thumbnail": "",
+            "uploader": "bench",
+            "acodec": self.acodec,
+            "ext": os.path.splitext(self.path)[1][1:],
+            "is_live": False,
+            "url": self.path,
+        }
+
+    async def close(self):
+        pass
+
+class StubSpotify:
+    """Enough of SpotifyClient for iter_spotify_tracks on a playlist link."""
+    def __init__(self, total, *, latency=0.0):
+        self.total = total
+        self.latency = latency
+
+    async def playlist_tracks(self, playlist_id, *, limit=100, offset=0):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        items = [{"track": {
+            "id": f"sp{i:07d}",
+            "name": f"Song {i}",
+            "artists": [{"name": f"Artist {i % 97}"}],
+            "duration_ms": 180000,
+            "external_urls": {"spotify": f"https://open.spotify.com/track/sp{i:07d}"},
+            "album": {"images": []},
+        }} for i in range(offset, min(offset + limit, self.total))]
+        return {"items": items, "total": self.total, "limit": limit}
+
+# ==========================
+# Fake Discord Objects
+# ==========================
+class FakeAudioPlayer(threading.Thread):
+    """Mirrors discord.player.AudioPlayer: reads on a 20 ms clock, encodes PCM to Opus, calls after() then cleanup()."""
+    def __init__(self, source, client, after):
+        super().__init__(daemon=True)
+        self.source = source
+        self.client = client
+        self.after = after
+        self._end = threading.Event()
+        self._resumed = threading.Event()
+        self._resumed.set()
+
+    def run(self):
+        error = None
+        encoder = self.client.make_encoder()
+        loops, start = 0, time.perf_counter()
+        try:
+            while not self._end.is_set():
+                if not self._resumed.is_set():
+                    self._resumed.wait()
+                    loops, start = 0, time.perf_counter()
+                    continue
+                data = self.source.read()
+                if not data:
+                    self.stop()
+                    break
+                if encoder is not None and not self.source.is_opus():
+                    encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+                loops += 1
+                delay = start + FRAME * loops - time.perf_counter()
+                self.client.frames += 1
+                if delay < 0:
+                    self.client.late += 1
+                time.sleep(max(0.0, delay))
+        except Exception as e:
+            error = e
+            self.stop()
+        finally:
+            if self.after:
+                self.after(error)
+            self.source.cleanup()
+
+    def stop(self):
+        self._end.set()
+        self._resumed.set()
+
+    def pause(self):
+        self._resumed.clear()
+
+    def resume(self):
+        self._resumed.set()
+
+    def is_playing(self):
+        return self._resumed.is_set() and not self._end.is_set()
+
+class FakeVoiceClient:
+    channel = None
+
+    def __init__(self, encode):
+        self.encode = encode
+        self._player = None
+        self.frames = 0
+        self.late = 0
+
+    def make_encoder(self):
+        return discord.opus.Encoder() if self.encode else None
+
+    @property
+    def source(self):
+        return self._player.source if self._player else None
+
+    @source.setter
+    def source(self, value):
+        self._player.source = value
+
+    def play(self, source, *, after=None):
+        if self.is_playing():
+            raise discord.ClientException("Already playing audio.")
+        self._player = FakeAudioPlayer(source, self, after)
+        self._player.start()
+
+    def stop(self):
+        if self._player:
+            self._player.stop()
+            self._player = None
+
+    def pause(self):
+        if self._player:
+            self._player.pause()
+
+    def resume(self):
+        if self._player:
+            self._player.resume()
+
+    def is_playing(self):
+        return self._player is not None and self._player.is_playing()
+
+    def is_paused(self):
+        return self._player is not None and not self._player._resumed.is_set()
+
+    def is_connected(self):
+        return True
+
+    async def disconnect(self, *, force=False):
+        self.stop()
+
+class FakeMessage:
+    async def edit(self, **kwargs):
+        return self
+
+    async def delete(self):
+        pass
+
+class FakeChannel:
+    def __init__(self):
+        self.sent = 0
+
+    async def send(self, *args, **kwargs):
+        self.sent += 1
+        return FakeMessage()
+
+class FakeAsset:
+    url = "https://cdn.discordapp.com/embed/avatars/0.png"
+
+class FakeUser:
+    id = 1
+    name = "Kurozaya"
+    display_avatar = FakeAsset()
+
+class FakeGuild:
+    def __init__(self, guild_id, voice_client):
+        self.id = guild_id
+        self.shard_id = 0
+        self.voice_client = voice_client
+
+class FakeContext:
+    def __init__(self, bot, guild):
+        self.bot = bot
+        self.guild = guild
+        self.channel = FakeChannel()
+        self.voice_client = guild.voice_client
+
+class FakeBot:
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.user = FakeUser()
+
+    async def wait_until_ready(self):
+        pass
+
+    def is_closed(self):
+        return False
+
+# ==========================
+# Benchmarks
+# ==========================
+async def bench_enqueue(tracks, latency):
+    """The ?play import path (page fetches, Track descriptors, queue inserts) without playback."""
+    queue = mp.TrackQueue()
+    spotify = StubSpotify(tracks, latency=latency)
+    started = time.perf_counter()
+    async for batch, total in mp.iter_spotify_tracks(spotify, "https://open.spotify.com/playlist/bench"):
+        queue.extend(batch)
+    elapsed = time.perf_counter() - started
+    return {"tracks": tracks, "seconds": elapsed, "tracks_per_s": tracks / elapsed, "us_per_track": elapsed / tracks * 1e6}
+
+def bench_queue_ops(size, repeats):
+    queue = mp.TrackQueue()
+    queue.extend(mp.Track(f"song {i % (size // 2)}") for i in range(size))
+
+    def per_op(fn):
+        started = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        return (time.perf_counter() - started) / repeats
+
+    def remove_middle():
+        queue.insert(len(queue) // 2, queue.remove(len(queue) // 2))
+
+    def move_ends():
+        queue.move(0, len(queue) - 1)
+
+    started = time.perf_counter()
+    dupes = len(queue.dedupe())
+    dedupe = time.perf_counter() - started
+    queue.extend(mp.Track(f"extra {i}") for i in range(dupes))
+    return {
+        "size": size,
+        "remove_us": per_op(remove_middle) * 1e6,
+        "move_us": per_op(move_ends) * 1e6,
+        "shuffle_ms": per_op(queue.shuffle) * 1e3,
+        "dedupe_ms": dedupe * 1e3,
+    }
+
+async def bench_stream_cpu(stub, frames):
+    """Reads one source as fast as ffmpeg delivers; python CPU per frame and ffmpeg CPU once it's reaped."""
+    results = {}
+    variants = [("pcm", 0.5)] + ([("opus", 1.0)] if stub.acodec == "opus" else [])
+    for name, volume in variants:
+        track = mp.Track.from_data(await stub.extract(f"cpu-{name}"))
+        source = await mp.YTDLSource.from_track(track, volume=volume)
+        before, cpu_before, wall_before = os.times(), time.process_time(), time.perf_counter()
+        read = 0
+        while read < frames and source.read():
+            read += 1
+        wall, cpu = time.perf_counter() - wall_before, time.process_time() - cpu_before
+        source.cleanup()
+        after = os.times()
+        ffmpeg_cpu = (after.children_user + after.children_system) - (before.children_user + before.children_system)
+        results[name] = {
+            "source": type(source).__name__,
+            "frames": read,
+            "python_us_per_frame": cpu / max(read, 1) * 1e6,
+            "ffmpeg_us_per_frame": ffmpeg_cpu / max(read, 1) * 1e6,
+            "realtime_factor": read * FRAME / wall if wall else None,
+        }
+    return results
+
+async def check_audio_cache(stub):
+    """Plays one track into an empty audio cache, then checks the file was committed and replays from disk."""
+    saved = mp.audio_cache
+    mp.audio_cache = mp.AudioCache(os.path.join(WORKDIR, "audio_cache"), max_bytes=1 << 30)
+    try:
+        track = mp.Track.from_data(await stub.extract("cache-check"))
+        source = await mp.YTDLSource.from_track(track, volume=1.0)
+        while source.read():
+            pass
+        source._process.wait(timeout=10)  # let ffmpeg finish the cache file before cleanup() reaps it
+        source.cleanup()
+        committed = mp.audio_cache.get(track.video_id) is not None
+        replayed = False
+        if committed:
+            replay = await mp.YTDLSource.from_track(track, volume=1.0)
+            replayed = bool(replay.read())
+            replay.cleanup()
+        return {"committed": committed, "replayed": replayed}
+    finally:
+        mp.audio_cache = saved
+
+async def run_guilds(cog, encode, count, seconds):
+    players = []
+    clients = []
+    for i in range(count):
+        vc = FakeVoiceClient(encode)
+        ctx = FakeContext(cog.bot, FakeGuild(1000 + i, vc))
+        player = cog.get_player(ctx)
+        player.queue.extend(mp.Track(f"guild {i} track {n}") for n in range(3))
+        players.append(player)
+        clients.append(vc)
+    cpu_before, times_before = time.process_time(), os.times()
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - cpu_before
+    for player in players:
+        cog.forget(player)
+    await asyncio.sleep(0.5)  # let the reader threads finish and ffmpeg get reaped
+    times_after = os.times()
+    frames = sum(vc.frames for vc in clients)
+    late = sum(vc.late for vc in clients)
+    return {
+        "guilds": count,
+        "frames": frames,
+        "late_ratio": late / frames if frames else 1.0,
+        "python_cores": cpu / seconds,
+        "ffmpeg_cores": ((times_after.children_user + times_after.children_system)
+                         - (times_before.children_user + times_before.children_system)) / seconds,
+    }
+
+async def bench_guilds(cog, encode, max_guilds, seconds, late_threshold):
+    levels = []
+    sustained = 0
+    count = 1
+    while count <= max_guilds:
+        result = await run_guilds(cog, encode, count, seconds)
+        levels.append(result)
+        print(f"  {count:4d} guilds: late {result['late_ratio']:.2%}, python {result['python_cores']:.2f} cores", file=sys.stderr)
+        if result["late_ratio"] > late_threshold:
+            break
+        sustained = count
+        count *= 2
+    return {"sustained": sustained, "late_threshold": late_threshold, "seconds_per_level": seconds, "levels": levels}
+
+# ==========================
+# Report
+# ==========================
+def lookup(report, dotted):
+    value = report
+    for part in dotted.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+def compare(report, baseline, tolerance):
+    """Returns human-readable regressions beyond `tolerance` (fractional) against a previous report."""
+    regressions = []
+    for key in COMPARED:
+        new, old = lookup(report, key), lookup(baseline, key)
+        if not isinstance(new, (int, float)) or not isinstance(old, (int, float)) or not old:
+            continue
+        change = (new - old) / old
+        worse = -change if key in HIGHER_IS_BETTER else change
+        if worse > tolerance:
+            regressions.append(f"{key}: {old:.4g} -> {new:.4g} ({change:+.0%})")
+    return regressions
+
+async def main(args):
+    ffmpeg = args.ffmpeg or shutil.which("ffmpeg")
+    if not ffmpeg:
+        sys.exit("ffmpeg not found; pass --ffmpeg")
+    for opts in (mp.ffmpeg_opts, mp.local_ffmpeg_opts):
+        opts["executable"] = ffmpeg
+    mp.ffmpeg_opts["before_options"] = ""  # the -reconnect flags only apply to HTTP inputs
+    path, acodec = make_test_audio(ffmpeg, args.track_seconds)
+    stub = StubExtractor(path, acodec, args.track_seconds, latency=args.extract_latency)
+    mp.extractor = stub
+
+    encode = True
+    try:
+        discord.opus.Encoder()
+    except Exception:
+        encode = False  # libopus missing: PCM sources are read but not encoded
+
+    cog = mp.Music(FakeBot())
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "discord": discord.__version__,
+            "cpus": os.cpu_count(),
+            "test_audio": acodec,
+            "opus_encode": encode,
+        }
+    }
+    print("enqueue...", file=sys.stderr)
+    report["enqueue"] = await bench_enqueue(args.playlist, args.spotify_latency)
+    print("queue ops...", file=sys.stderr)
+    report["queue_ops"] = bench_queue_ops(args.queue_size, args.repeats)
+    print("stream cpu...", file=sys.stderr)
+    report["stream_cpu"] = await bench_stream_cpu(stub, args.frames)
+    print("audio cache...", file=sys.stderr)
+    report["audio_cache"] = await check_audio_cache(stub)
+    if args.max_guilds:
+        print("guilds...", file=sys.stderr)
+        report["guilds"] = await bench_guilds(cog, encode, args.max_guilds, args.level_seconds, args.late_threshold)
+    await cog.cog_unload()
+    report["meta"]["extractions"] = stub.calls
+
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if not all(report["audio_cache"].values()):
+        print(f"FAILED audio cache: {report['audio_cache']}", file=sys.stderr)
+        return 1
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the music cog")
+    parser.add_argument("--report", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous report; exit 1 if anything regressed past --tolerance")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--ffmpeg", help="ffmpeg executable (default: from PATH)")
+    parser.add_argument("--playlist", type=int, default=10000, help="tracks in the simulated Spotify import")
+    parser.add_argument("--queue-size", type=int, default=10000)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--frames", type=int, default=1500, help="frames read per stream CPU sample")
+    parser.add_argument("--track-seconds", type=int, default=60)
+    parser.add_argument("--extract-latency", type=float, default=0.0, help="simulated yt-dlp latency in seconds")
+    parser.add_argument("--spotify-latency", type=float, default=0.0, help="simulated Spotify page latency in seconds")
+    parser.add_argument("--max-guilds", type=int, default=64, help="0 skips the concurrency ramp")
+    parser.add_argument("--level-seconds", type=float, default=10.0)
+    parser.add_argument("--late-threshold", type=float, default=0.01, help="late frame ratio that ends the ramp")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(main(parse_args())))
+    finally:
+        shutil.rmtree(WORKDIR, ignore_errors=True)
@@ -30,13 +30,13 @@ class Help(commands.Cog):
                 value=(
                     "`play`, `join`, `connect`, `pause`, `resume`, `skip`, `queue`, `remove`, "
                     "`move`, `disconnect`, `leave`, `lyrics`, `loop`, `shuffle`, `clearqueue`, "
-                    "`nowplaying`, `pitch`, `speed`, `removedupes`"
+                    "`nowplaying`, `seek`, `pitch`, `speed`, `removedupes`, `radio`"
                 ),
                 inline=False
             )
             embed.add_field(
                 name="⚙️ Utility",
-                value="`ping`, `purge`, `assign`, `removerole`, `dm`, `reply`",
+                value="`ping`, `shards`, `purge`, `assign`, `removerole`, `dm`, `reply`",
                 inline=False
             )
             embed.add_field(
@@ -46,7 +46,7 @@ class Help(commands.Cog):
             )
             embed.add_field(
                 name="ℹ️ More",
-                value="Use `?help <category>` for details.",
+                value="Use `?help <category>` for details. Music commands also work as `/` slash commands.",
                 inline=False
             )
         else:
@@ -61,7 +61,7 @@ class Help(commands.Cog):
                         "`pause` - Pause current track\n"
                         "`resume` - Resume paused track\n"
                         "`skip` - Skip current track\n"
-                        "`queue` - Show queue\n"
+                        "`queue [page]` - Show queue\n"
                         "`remove <pos>` - Remove track from queue\n"
                         "`move <from> <to>` - Move track in queue\n"
                         "`disconnect/leave` - Leave VC\n"
@@ -70,9 +70,11 @@ class Help(commands.Cog):
                         "`shuffle` - Shuffle queue\n"
                         "`clearqueue` - Clear all queued songs\n"
                         "`nowplaying` - Show now playing info\n"
+                        "`seek <m:ss>` - Jump to a position in the current track\n"
                         "`pitch <value>` - Change pitch\n"
                         "`speed <value>` - Change speed\n"
-                        "`removedupes` - Remove duplicate songs in queue"
+                        "`removedupes` - Remove duplicate songs in queue\n"
+                        "`radio [start|join|leave] <name>` - Shared 24/7 stations"
                     ),
                     inline=False
                 )
@@ -1,14 +1,22 @@
 import discord
 from discord.ext import commands, tasks
 import asyncio
+import audioop
+import functools
+import logging
+import math
+import time
 from async_timeout import timeout
-import yt_dlp as youtube_dl
-import lyricsgenius
 import os
 import re
-import spotipy
-from spotipy.oauth2 import SpotifyClientCredentials
 import random
+import shlex
+import threading
+from collections import deque
+from itertools import islice
+
+from services import SpotifyClient, GeniusClient, shutdown_executor, executor_queue_depth, ExtractionCache, stream_expiry, ExtractionService, AudioCache
+from services import REGISTRY, MetricsServer, PlayerStore, METADATA_KEYS, LyricsService, split_pages, LoudnessService
 
 # ==========================
 # CONFIG
@@ -16,15 +24,79 @@ import random
 FFMPEG_PATH = r"C:\Users\Administrator\AppData\Local\Microsoft\WinGet\Links\ffmpeg.exe"
 DEFAULT_COLOR = 0x4c00b0
 
-GENIUS_TOKEN = os.getenv("GENIUS_TOKEN")
-genius = lyricsgenius.Genius(GENIUS_TOKEN) if GENIUS_TOKEN else None
+log = logging.getLogger(__name__)
+
+# How many upcoming tracks get their stream URL resolved ahead of time
+PREFETCH_DEPTH = int(os.getenv("MUSIC_PREFETCH_DEPTH", "2"))
+# Fallback lifetime for stream URLs that don't carry an expire= parameter
+STREAM_URL_TTL = int(os.getenv("MUSIC_STREAM_URL_TTL", str(60 * 60)))
+EXTRACTION_CACHE_PATH = os.getenv("EXTRACTION_CACHE_PATH", "data/extraction_cache.sqlite3")
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "5000"))
+
+# Seconds before a track ends at which the next track's ffmpeg gets spawned
+PREWARM_SECONDS = float(os.getenv("MUSIC_PREWARM_SECONDS", "5"))
+# Overlap between consecutive PCM tracks; 0 means plain gapless handoff
+CROSSFADE_SECONDS = float(os.getenv("MUSIC_CROSSFADE_SECONDS", "0"))
+
+# Optional local copy of played audio; 0 disables the cache
+AUDIO_CACHE_DIR = os.getenv("AUDIO_CACHE_DIR", "data/audio_cache")
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", "0"))
+# Longer uploads (mixes, 10-hour loops) are never cached
+AUDIO_CACHE_MAX_TRACK_SECONDS = int(os.getenv("AUDIO_CACHE_MAX_TRACK_SECONDS", "900"))
+
+# Spotify playlist/album pages fetched in parallel during an import
+SPOTIFY_PAGE_CONCURRENCY = int(os.getenv("SPOTIFY_PAGE_CONCURRENCY", "4"))
+# Minimum seconds between progress edits of the loading message
+PROGRESS_EDIT_INTERVAL = 2.0
+
+DEFAULT_VOLUME = float(os.getenv("MUSIC_DEFAULT_VOLUME", "1.0"))
+# At unity volume, hand YouTube's Opus packets to Discord as-is instead of decoding to PCM and re-encoding
+OPUS_PASSTHROUGH = os.getenv("MUSIC_OPUS_PASSTHROUGH", "1") != "0"
+
+# Voice supervisor: reconnect attempts after an unexpected drop, with exponential backoff between them
+VOICE_RECONNECT_ATTEMPTS = int(os.getenv("VOICE_RECONNECT_ATTEMPTS", "5"))
+VOICE_RECONNECT_BACKOFF = float(os.getenv("VOICE_RECONNECT_BACKOFF", "1"))
+VOICE_RECONNECT_BACKOFF_MAX = 30.0
+VOICE_CONNECT_TIMEOUT = 15.0
+# discord.py reconnects the voice websocket by itself first; give it this long before stepping in
+VOICE_RECONNECT_GRACE = float(os.getenv("VOICE_RECONNECT_GRACE", "5"))
+# Times one play of a track may be resumed after interruptions before it's given up on
+MAX_TRACK_RECOVERIES = 3
+# ffmpeg hitting EOF more than this many seconds before the end means the stream broke, not the song
+STREAM_END_SLACK = 5.0
+
+# Loudness normalization: each video is measured once and played at this integrated loudness (LUFS)
+LOUDNESS_NORMALIZE = os.getenv("MUSIC_LOUDNESS_NORMALIZE", "1") != "0"
+LOUDNESS_TARGET = float(os.getenv("MUSIC_LOUDNESS_TARGET", "-14"))
+LOUDNESS_CACHE_PATH = os.getenv("LOUDNESS_CACHE_PATH", "data/loudness.sqlite3")
+# Analysis reads the whole track, so long uploads are left alone
+LOUDNESS_MAX_TRACK_SECONDS = int(os.getenv("LOUDNESS_MAX_TRACK_SECONDS", "900"))
+
+# Packets a station listener buffers before it starts playing (20 ms each)
+BROADCAST_JITTER_FRAMES = int(os.getenv("BROADCAST_JITTER_FRAMES", "10"))
+# Hard cap per listener; a guild whose audio thread falls behind drops the oldest packets
+BROADCAST_BUFFER_FRAMES = int(os.getenv("BROADCAST_BUFFER_FRAMES", "50"))
+OPUS_SILENCE = b"\xf8\xff\xfe"
+
+# Local Prometheus endpoint (GET /metrics); 0 disables it
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
 
-SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
-spotify = spotipy.Spotify(auth_manager=SpotifyClientCredentials(client_id=SPOTIFY_CLIENT_ID, client_secret=SPOTIFY_CLIENT_SECRET))
+# Player snapshots for resuming after a restart
+PLAYER_STATE_PATH = os.getenv("PLAYER_STATE_PATH", "data/player_state.sqlite3")
+PLAYER_SNAPSHOT_INTERVAL = float(os.getenv("PLAYER_SNAPSHOT_INTERVAL", "15"))
+# Snapshots older than this are not restored (the bot was down for too long)
+PLAYER_STATE_MAX_AGE = int(os.getenv("PLAYER_STATE_MAX_AGE", str(6 * 60 * 60)))
+# Voice reconnects done in parallel on startup
+RESTORE_CONCURRENCY = 5
 
-SPOTIFY_TRACK_RE = re.compile(r"https?://open\.spotify\.com/track/([a-zA-Z0-9]+)")
-SPOTIFY_PLAYLIST_RE = re.compile(r"https?://open\.spotify\.com/playlist/([a-zA-Z0-9]+)")
+# Changes to the now-playing message within this window are folded into one edit
+NP_DEBOUNCE = float(os.getenv("MUSIC_NP_DEBOUNCE", "1.5"))
+QUEUE_PAGE_SIZE = 10
+LYRICS_CACHE_PATH = os.getenv("LYRICS_CACHE_PATH", "data/lyrics_cache.sqlite3")
+PAGE_RE = re.compile(r"Page (\d+)/")
+
+SPOTIFY_URL_RE = re.compile(r"https?://open\.spotify\.com/(?:intl-[a-zA-Z-]+/)?(track|playlist|album|artist)/([a-zA-Z0-9]+)")
 
 ytdlopts = {
     "format": "bestaudio/best",
@@ -35,13 +107,35 @@ ytdlopts = {
     "default_search": "ytsearch",
     "source_address": "0.0.0.0"
 }
-ytdl = youtube_dl.YoutubeDL(ytdlopts)
+extractor = ExtractionService(ytdlopts)
+extraction_cache = ExtractionCache(EXTRACTION_CACHE_PATH, max_entries=EXTRACTION_CACHE_MAX_ENTRIES)
+audio_cache = AudioCache(AUDIO_CACHE_DIR, max_bytes=AUDIO_CACHE_MAX_BYTES) if AUDIO_CACHE_MAX_BYTES > 0 else None
+player_store = PlayerStore(PLAYER_STATE_PATH)
+loudness = LoudnessService(FFMPEG_PATH, LOUDNESS_CACHE_PATH, target=LOUDNESS_TARGET) if LOUDNESS_NORMALIZE else None
+
+EXTRACTION_SECONDS = REGISTRY.histogram("kz_extraction_seconds", "yt-dlp extraction time (cache misses only)")
+FFMPEG_START_SECONDS = REGISTRY.histogram("kz_ffmpeg_start_seconds", "Time to spawn ffmpeg for a source",
+                                          buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+FIRST_AUDIO_SECONDS = REGISTRY.histogram("kz_time_to_first_audio_seconds", "Track taken off the queue until its first audio frame")
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("kz_queue_wait_seconds", "Time the player loop waited for a queued track",
+                                        buckets=(0.01, 0.1, 1.0, 10.0, 60.0, 300.0))
+EMBED_SEND_SECONDS = REGISTRY.histogram("kz_embed_send_seconds", "Now playing message send latency")
+CACHE_LOOKUPS = REGISTRY.counter("kz_cache_lookups_total", "Extraction and audio cache lookups", ("cache", "result"))
+FFMPEG_PROCESSES = REGISTRY.gauge("kz_ffmpeg_processes", "Live ffmpeg processes owned by playback sources")
+VOICE_RECONNECTS = REGISTRY.counter("kz_voice_reconnects_total", "Voice reconnect attempts by outcome", ("result",))
+PLAYBACK_RECOVERIES = REGISTRY.counter("kz_playback_recoveries_total", "Tracks resumed after an interruption", ("cause",))
+RECOVERY_SECONDS = REGISTRY.histogram("kz_recovery_seconds", "Playback interrupted until the track plays again")
+REGISTRY.gauge("kz_extraction_waiting", "Extractions waiting for an idle worker", fn=lambda: extractor.waiting)
 
 ffmpeg_opts = {
     "before_options": "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5",
     "options": "-vn",
     "executable": FFMPEG_PATH,
 }
+local_ffmpeg_opts = {
+    "options": "-vn",
+    "executable": FFMPEG_PATH,
+}
 
 # ==========================
 # Helper Functions
@@ -49,28 +143,360 @@ ffmpeg_opts = {
 def is_spotify_link(url: str) -> bool:
     return "open.spotify.com" in url
 
-async def fetch_youtube_links_from_spotify(spotify_url: str):
+def parse_timestamp(value: str):
+    """Parses `90`, `1:30` or `1:02:03` into seconds; None if it isn't a timestamp."""
+    try:
+        parts = [float(p) for p in value.split(":")]
+    except ValueError:
+        return None
+    if not 1 <= len(parts) <= 3 or any(p < 0 or not math.isfinite(p) for p in parts):
+        return None
+    seconds = 0.0
+    for part in parts:
+        seconds = seconds * 60 + part
+    return seconds
+
+def filter_chain(pitch=1.0, speed=1.0, gain=1.0):
     """
-    Converts Spotify playlist/track to a list of YouTube search strings.
+    ffmpeg -af chain for a pitch factor, a speed factor and a linear gain, or None at 1.0/1.0/1.0.
+    asetrate shifts pitch and tempo together, so atempo then corrects the tempo
+    to the requested speed; atempo only accepts 0.5-2.0 per stage.
     """
-    urls = []
-
-    if SPOTIFY_TRACK_RE.match(spotify_url):
-        track_id = SPOTIFY_TRACK_RE.match(spotify_url).group(1)
-        track = spotify.track(track_id)
-        urls.append(f"{track['name']} {track['artists'][0]['name']}")
-    elif SPOTIFY_PLAYLIST_RE.match(spotify_url):
-        playlist_id = SPOTIFY_PLAYLIST_RE.match(spotify_url).group(1)
-        playlist = spotify.playlist_tracks(playlist_id)
-        for item in playlist['items']:
-            track = item['track']
-            urls.append(f"{track['name']} {track['artists'][0]['name']}")
-    return urls
+    filters = []
+    if pitch != 1.0 or speed != 1.0:
+        filters.append("aresample=48000")
+        if pitch != 1.0:
+            filters += [f"asetrate={48000 * pitch:.0f}", "aresample=48000"]
+        tempo = speed / pitch
+        while tempo > 2.0:
+            filters.append("atempo=2.0")
+            tempo /= 2.0
+        while tempo < 0.5:
+            filters.append("atempo=0.5")
+            tempo /= 0.5
+        if tempo != 1.0:
+            filters.append(f"atempo={tempo:.4f}")
+    if gain != 1.0:
+        filters.append(f"volume={gain:.4f}")
+    return ",".join(filters) or None
+
+def format_time(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 60}:{seconds % 60:02}"
+
+async def iter_spotify_tracks(spotify, spotify_url: str):
+    """
+    Yields (batch, total) for a Spotify track/playlist/album/artist link.
+    Batches are unresolved Track descriptors in playlist order; pages after
+    the first are fetched concurrently, at most SPOTIFY_PAGE_CONCURRENCY at a time.
+    """
+    match = SPOTIFY_URL_RE.match(spotify_url)
+    if not match:
+        return
+    kind, sp_id = match.groups()
+
+    if kind == "track":
+        yield [Track.from_spotify(await spotify.track(sp_id))], 1
+        return
+    if kind == "artist":
+        top = (await spotify.artist_top_tracks(sp_id))["tracks"]
+        yield [Track.from_spotify(t) for t in top], len(top)
+        return
+
+    if kind == "playlist":
+        album = None
+        first = await spotify.playlist_tracks(sp_id, limit=100)
+        fetch_page = functools.partial(spotify.playlist_tracks, sp_id, limit=100)
+    else:
+        album = await spotify.album(sp_id)
+        first = album["tracks"]
+        fetch_page = functools.partial(spotify.album_tracks, sp_id, limit=50)
+
+    def to_tracks(page):
+        items = page["items"] if album else [i.get("track") for i in page["items"]]
+        return [Track.from_spotify(t, album=album) for t in items if t]
+
+    total = first["total"]
+    yield to_tracks(first), total
+
+    sem = asyncio.Semaphore(SPOTIFY_PAGE_CONCURRENCY)
+
+    async def bounded(offset):
+        async with sem:
+            return await fetch_page(offset=offset)
+
+    pending = [asyncio.ensure_future(bounded(offset)) for offset in range(first["limit"], total, first["limit"])]
+    try:
+        for task in pending:
+            yield to_tracks(await task), total
+    finally:
+        for task in pending:
+            task.cancel()
+
+# ==========================
+# Track Descriptor
+# ==========================
+class Track:
+    """
+    Lightweight queue entry. Holds display metadata, the yt-dlp info dict once
+    the video is known, and separately the short-lived stream URL.
+    """
+    def __init__(self, query, *, title=None, url=None, duration=0, thumbnail="", uploader="", spotify_id=None):
+        self.query = query
+        self.title = title or query
+        self.url = url or ""
+        self.duration = duration or 0
+        self.thumbnail = thumbnail or ""
+        self.uploader = uploader or ""
+        self.spotify_id = spotify_id
+        self.data = None
+        self.stream_url = None
+        self.expires_at = 0.0
+        self.resume_at = 0.0  # offset to start from the next time it plays (restored players, recoveries)
+        self.recoveries = 0  # interruptions resumed during the current play
+
+    @classmethod
+    def from_data(cls, data, *, query=None):
+        track = cls(query or data.get("webpage_url"))
+        track.update(data)
+        return track
+
+    @classmethod
+    def from_spotify(cls, sp_track, *, album=None):
+        name = sp_track["name"]
+        artist = sp_track["artists"][0]["name"] if sp_track.get("artists") else ""
+        images = (sp_track.get("album") or album or {}).get("images") or []
+        return cls(
+            f"{name} {artist}".strip(),
+            title=f"{name} - {artist}" if artist else name,
+            url=(sp_track.get("external_urls") or {}).get("spotify", ""),
+            duration=(sp_track.get("duration_ms") or 0) // 1000,
+            thumbnail=images[0]["url"] if images else "",
+            uploader=artist,
+            spotify_id=sp_track.get("id"),
+        )
+
+    @classmethod
+    def from_dict(cls, d):
+        track = cls(d["query"], title=d.get("title"), url=d.get("url"), duration=d.get("duration"),
+                    thumbnail=d.get("thumbnail"), uploader=d.get("uploader"), spotify_id=d.get("spotify_id"))
+        # Known video but no stream URL: resolve() goes straight to the video page, usually an extraction cache hit
+        track.data = d.get("data")
+        return track
+
+    def to_dict(self):
+        """Descriptor for the player store: display fields and the video's metadata, never the stream URL."""
+        d = {
+            "query": self.query,
+            "title": self.title,
+            "url": self.url,
+            "duration": self.duration,
+            "thumbnail": self.thumbnail,
+            "uploader": self.uploader,
+            "spotify_id": self.spotify_id,
+        }
+        if self.data:
+            d["data"] = {k: self.data.get(k) for k in METADATA_KEYS}
+        return d
+
+    def update(self, data):
+        self.data = data
+        self.title = data.get("title") or self.title
+        self.url = data.get("webpage_url") or self.url
+        self.duration = data.get("duration") or self.duration
+        self.thumbnail = data.get("thumbnail") or self.thumbnail
+        self.uploader = data.get("uploader") or self.uploader
+        if data.get("url"):
+            self.stream_url = data["url"]
+            self.expires_at = data.get("expires_at") or stream_expiry(data["url"], STREAM_URL_TTL)
+
+    @property
+    def video_id(self):
+        return self.data.get("id") if self.data else None
+
+    @property
+    def target(self):
+        """What to hand yt-dlp: the resolved video page if known, else the original query."""
+        return self.url if self.data else self.query
+
+    @property
+    def is_fresh(self):
+        return self.stream_url is not None and time.time() < self.expires_at
+
+    @property
+    def keys(self):
+        """Identifiers that mark two queue entries as the same song."""
+        keys = {k for k in (self.video_id, self.spotify_id) if k}
+        return keys or {self.query}
+
+# ==========================
+# Track Queue
+# ==========================
+class TrackQueue:
+    """
+    Awaitable FIFO of Track descriptors consumed by MusicPlayer.player_loop.
+    Edits happen in place on a deque (no rebuilds, no re-puts), and every
+    change bumps `version` so views can tell when a cached render is stale.
+    Positions are 0-based here; commands translate from the 1-based UI.
+    """
+    def __init__(self):
+        self._items = deque()
+        self._not_empty = asyncio.Event()
+        self.version = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def _changed(self):
+        self.version += 1
+        if self._items:
+            self._not_empty.set()
+        else:
+            self._not_empty.clear()
+
+    def empty(self):
+        return not self._items
+
+    def peek(self, n):
+        return list(islice(self._items, n))
+
+    async def get(self):
+        while not self._items:
+            await self._not_empty.wait()
+        track = self._items.popleft()
+        self._changed()
+        return track
+
+    def put(self, track):
+        self._items.append(track)
+        self._changed()
+
+    def push_front(self, track):
+        self._items.appendleft(track)
+        self._changed()
+
+    def extend(self, tracks):
+        self._items.extend(tracks)
+        self._changed()
+
+    def insert(self, index, track):
+        self._items.insert(index, track)
+        self._changed()
+
+    def remove(self, index):
+        track = self._items[index]
+        del self._items[index]
+        self._changed()
+        return track
+
+    def discard(self, track):
+        """Removes a specific track object wherever it sits; returns whether it was queued."""
+        try:
+            self._items.remove(track)
+        except ValueError:
+            return False
+        self._changed()
+        return True
+
+    def move(self, old, new):
+        track = self._items[old]
+        del self._items[old]
+        self._items.insert(new, track)
+        self._changed()
+        return track
+
+    def shuffle(self):
+        # random.shuffle indexes into the middle of a deque, which is O(n) per access
+        items = list(self._items)
+        random.shuffle(items)
+        self._items = deque(items)
+        self._changed()
+
+    def dedupe(self):
+        """Drops later copies of the same song; returns the removed tracks."""
+        seen, kept, removed = set(), deque(), []
+        for track in self._items:
+            keys = track.keys
+            if keys & seen:
+                removed.append(track)
+            else:
+                seen |= keys
+                kept.append(track)
+        if removed:
+            self._items = kept
+            self._changed()
+        return removed
+
+    def clear(self):
+        removed = list(self._items)
+        self._items.clear()
+        self._changed()
+        return removed
 
 # ==========================
 # YTDL Source
 # ==========================
-class YTDLSource(discord.PCMVolumeTransformer):
+class StreamStateMixin:
+    """
+    Shared by both playback sources: counts 20 ms frames read (the position
+    tracker) and, when ffmpeg is also writing the stream to the audio cache,
+    commits that file only if playback actually reached the end.
+    """
+    frames = 0
+    reached_eof = False
+    cache_part = None
+    start = 0.0  # -ss offset ffmpeg was started at
+    tempo = 1.0  # media seconds per second of output
+    spawned = False  # counted in FFMPEG_PROCESSES
+    first_audio_from = None  # perf_counter() when the track was dequeued, for time-to-first-audio
+
+    @property
+    def position(self):
+        return self.start + self.frames * 0.02 * self.tempo
+
+    @property
+    def remaining(self):
+        """Wall-clock seconds until the track ends."""
+        return max(self.duration - self.position, 0) / self.tempo
+
+    def read(self):
+        data = super().read()
+        if data:
+            if not self.frames and self.first_audio_from is not None:
+                FIRST_AUDIO_SECONDS.observe(time.perf_counter() - self.first_audio_from)
+            self.frames += 1
+        else:
+            self.reached_eof = True
+        return data
+
+    def cleanup(self):
+        super().cleanup()
+        if self.spawned:
+            self.spawned = False
+            FFMPEG_PROCESSES.dec()
+        part, self.cache_part = self.cache_part, None
+        if part:
+            # EOF alone isn't enough: a dropped connection also ends the stream early
+            complete = self.reached_eof and self.frames * 0.02 >= self.duration * 0.9
+            if complete:
+                audio_cache.commit(self.data["id"], part)
+            else:
+                audio_cache.discard(part)
+
+class UnityVolumeTransformer(discord.PCMVolumeTransformer):
+    """PCMVolumeTransformer that hands frames through untouched at volume 1.0 (gain is applied in ffmpeg)."""
+    def read(self):
+        if self.volume == 1.0:
+            return self.original.read()
+        return super().read()
+
+class YTDLSource(StreamStateMixin, UnityVolumeTransformer):
     def __init__(self, source, *, data, volume=0.5):
         super().__init__(source, volume)
         self.data = data
@@ -81,145 +507,948 @@ class YTDLSource(discord.PCMVolumeTransformer):
         self.uploader = data.get("uploader") or ""
 
     @classmethod
-    async def create_source(cls, search: str, *, loop, volume=0.5):
-        loop = loop or asyncio.get_event_loop()
-        data = await loop.run_in_executor(None, lambda: ytdl.extract_info(search, download=False))
-        if "entries" in data:
-            data = data["entries"][0]
-        return cls(discord.FFmpegPCMAudio(data["url"], **ffmpeg_opts), data=data, volume=volume)
+    async def extract(cls, search: str, *, need_stream=True):
+        """
+        Returns yt-dlp info for a search string or URL, consulting the extraction cache first.
+        With need_stream=False cached metadata without a fresh stream URL is good enough.
+        """
+        cached = extraction_cache.get(search)
+        if cached and ("url" in cached or not need_stream):
+            CACHE_LOOKUPS.inc(cache="extraction", result="hit")
+            return cached
+        CACHE_LOOKUPS.inc(cache="extraction", result="miss")
+        target = cached["webpage_url"] if cached and cached.get("webpage_url") else search
+
+        with EXTRACTION_SECONDS.time():
+            data = await extractor.extract(target)
+        data["expires_at"] = stream_expiry(data["url"], STREAM_URL_TTL)
+        extraction_cache.put(search, data)
+        return data
+
+    @classmethod
+    def lookup_cached(cls, track):
+        """Fills in metadata for a Spotify track whose video was picked on an earlier import, without any network."""
+        if track.data is None and track.spotify_id:
+            cached = extraction_cache.get_spotify(track.spotify_id)
+            if cached:
+                track.update(cached)
+
+    @classmethod
+    async def resolve(cls, track):
+        """Makes sure the track has a fresh stream URL; Spotify tracks reuse the video picked for them last time."""
+        if track.is_fresh:
+            return
+        cls.lookup_cached(track)
+        if track.is_fresh:
+            return
+        track.update(await cls.extract(track.target))
+        if track.spotify_id and track.video_id:
+            extraction_cache.put_spotify(track.spotify_id, track.video_id)
+
+    @classmethod
+    def measure(cls, track):
+        """Starts a background loudness analysis of the track's video, from the cached file if there is one."""
+        if loudness is None or not track.video_id or track.data.get("is_live") \
+                or not 0 < track.duration <= LOUDNESS_MAX_TRACK_SECONDS:
+            return
+        local = audio_cache.get(track.video_id) if audio_cache is not None else None
+        if local:
+            loudness.analyze(track.video_id, local)
+        elif track.is_fresh:
+            loudness.analyze(track.video_id, track.stream_url, before_options=shlex.split(ffmpeg_opts["before_options"]))
+
+    @classmethod
+    async def from_track(cls, track, *, volume=0.5, start=0.0, pitch=1.0, speed=1.0):
+        """
+        Builds a playable source, re-extracting only if the track's stream URL is missing or stale.
+        Tracks in the audio cache play from disk; otherwise the first play is tee'd into it.
+        Opus streams at unity gain skip the PCM path entirely (see OpusPassthroughSource).
+        `start` seeks on the ffmpeg input; pitch/speed and the volume times the track's
+        loudness gain become an -af filter chain, so Python never scales the frames.
+        """
+        cache_part = None
+        if audio_cache is not None:
+            cls.lookup_cached(track)
+        local = audio_cache.get(track.video_id) if audio_cache is not None and track.video_id else None
+        if audio_cache is not None and track.video_id:
+            CACHE_LOOKUPS.inc(cache="audio", result="hit" if local else "miss")
+
+        if local:
+            source_input, opts = local, local_ffmpeg_opts
+        else:
+            await cls.resolve(track)
+            source_input, opts = track.stream_url, ffmpeg_opts
+        gain = volume * (loudness.gain(track.video_id) if loudness else 1.0)
+        chain = filter_chain(pitch, speed, gain)
+        passthrough = OPUS_PASSTHROUGH and not chain and track.data.get("acodec") == "opus"
+
+        before_options = opts.get("before_options", "")
+        options = "-vn"
+        if start:
+            before_options = f"-ss {start:.2f} {before_options}".strip()
+        if chain:
+            options += f" -af {chain}"
+        if not start and not local and audio_cache is not None and not track.data.get("is_live") \
+                and 0 < track.duration <= AUDIO_CACHE_MAX_TRACK_SECONDS:
+            cache_part = audio_cache.reserve(track.video_id)
+        if cache_part:
+            # Output #0 is the cache file (stream copy, unfiltered); the second -map starts the pipe:1 output discord.py reads
+            pipe_format = "-f opus -c:a copy" if passthrough else "-f s16le -ar 48000 -ac 2"
+            if chain:
+                pipe_format = f"-af {chain} {pipe_format}"
+            options = f"-vn -map 0:a -c:a copy -f matroska {shlex.quote(cache_part)} -map 0:a {pipe_format}"
+        opts = dict(opts, before_options=before_options, options=options)
+
+        with FFMPEG_START_SECONDS.time():
+            if passthrough:
+                source = OpusPassthroughSource(source_input, data=track.data, opts=opts)
+            else:
+                source = cls(discord.FFmpegPCMAudio(source_input, **opts), data=track.data, volume=1.0)
+        source.spawned = True
+        FFMPEG_PROCESSES.inc()
+        source.cache_part = cache_part
+        source.start = start
+        source.tempo = speed
+        source.track = track
+        return source
+
+class OpusPassthroughSource(StreamStateMixin, discord.FFmpegOpusAudio):
+    """
+    ffmpeg remuxes the WebM/Ogg Opus stream with -c:a copy and discord.py sends the
+    packets unchanged: no decode, no per-frame volume scaling, no libopus encode.
+    The codec comes from yt-dlp's format info, so no separate ffprobe run is needed.
+    """
+    def __init__(self, source, *, data, opts=ffmpeg_opts):
+        super().__init__(source, codec="copy", **opts)
+        self.data = data
+        self.title = data.get("title")
+        self.url = data.get("webpage_url")
+        self.thumbnail = data.get("thumbnail") or ""
+        self.duration = data.get("duration") or 0
+        self.uploader = data.get("uploader") or ""
+
+class CrossfadeSource(discord.AudioSource):
+    """
+    Mixes the tail of the outgoing PCM source into the head of the incoming one.
+    The outgoing source is read to its natural end (so its cache file completes);
+    after that the incoming source passes straight through and on_handoff fires.
+    """
+    def __init__(self, outgoing, incoming, *, frames, on_handoff):
+        self.outgoing = outgoing
+        self.incoming = incoming
+        self.total = max(frames, 1)
+        self.done = 0
+        self.on_handoff = on_handoff
+
+    def read(self):
+        if self.outgoing is None:
+            return self.incoming.read()
+        old = self.outgoing.read()
+        if not old:
+            self.outgoing = None
+            self.on_handoff(self.incoming)
+            return self.incoming.read()
+        gain = max(0.0, 1.0 - self.done / self.total)
+        self.done += 1
+        new = self.incoming.read()
+        size = max(len(old), len(new))
+        old = audioop.mul(old.ljust(size, b"\0"), 2, gain)
+        new = audioop.mul(new.ljust(size, b"\0"), 2, 1.0 - gain)
+        return audioop.add(old, new, 2)
+
+    def is_opus(self):
+        return False
+
+    def cleanup(self):
+        if self.outgoing:
+            self.outgoing.cleanup()
+        self.incoming.cleanup()
+
+# ==========================
+# Broadcast Hub
+# ==========================
+class HubSubscriber(discord.AudioSource):
+    """
+    One guild's tap on a station. The hub thread appends Opus packets and the guild's
+    audio thread pops them; a few frames are buffered first to absorb drift between the
+    two clocks. Never returns b"" (that would end playback), so it survives track changes.
+    """
+    def __init__(self, hub):
+        self.hub = hub
+        self.buffer = deque(maxlen=BROADCAST_BUFFER_FRAMES)
+        self.primed = False
+
+    def read(self):
+        if not self.primed:
+            if len(self.buffer) < BROADCAST_JITTER_FRAMES:
+                return OPUS_SILENCE
+            self.primed = True
+        try:
+            return self.buffer.popleft()
+        except IndexError:
+            self.primed = False  # underrun: refill before playing again
+            return OPUS_SILENCE
+
+    def is_opus(self):
+        return True
+
+    def cleanup(self):
+        self.hub.unsubscribe(self)
+
+class BroadcastHub:
+    """
+    A station shared by many guilds: one ffmpeg and at most one Opus encoder per track,
+    however many guilds listen. A pump thread reads the source in real time and copies
+    every packet into each subscriber's buffer, so guilds can tune in mid-track.
+    The station plays its queue on repeat and closes once the last guild leaves.
+    """
+    def __init__(self, bot, name, *, on_empty, on_track):
+        self.bot = bot
+        self.name = name
+        self.queue = TrackQueue()
+        self.current = None
+        self.subscribers = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._on_empty = on_empty
+        self._on_track = on_track
+        self._task = self.bot.loop.create_task(self.run())
+
+    def subscribe(self):
+        sub = HubSubscriber(self)
+        with self._lock:
+            self.subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        # Runs on the guild's audio thread when its voice client lets go of the source
+        with self._lock:
+            self.subscribers.discard(sub)
+            empty = not self.subscribers
+        if empty and not self._stopped.is_set():
+            self.bot.loop.call_soon_threadsafe(self._on_empty, self)
+
+    def close(self):
+        self._stopped.set()
+        if not self._task.done():
+            self._task.cancel()
+
+    async def run(self):
+        await self.bot.wait_until_ready()
+        while not self._stopped.is_set():
+            track = await self.queue.get()
+            try:
+                # Unity volume and no filters, so Opus uploads go out without any decode at all
+                source = await YTDLSource.from_track(track, volume=1.0)
+            except Exception as e:
+                log.warning("Station %s dropped %r: %s", self.name, track.query, e)
+                continue
+            self.current = source
+            self._on_track(self)
+            done = self.bot.loop.create_future()
+            threading.Thread(target=self._pump, args=(source, done), name=f"station-{self.name}", daemon=True).start()
+            try:
+                await done
+            finally:
+                self.current = None
+                source.cleanup()
+            self.queue.put(track)
+
+    def _pump(self, source, done):
+        encoder = None if source.is_opus() else discord.opus.Encoder()
+        delay = discord.opus.Encoder.FRAME_LENGTH / 1000
+        next_tick = time.perf_counter()
+        try:
+            while not self._stopped.is_set():
+                data = source.read()
+                if not data:
+                    break
+                packet = data if encoder is None else encoder.encode(data, encoder.SAMPLES_PER_FRAME)
+                with self._lock:
+                    subscribers = list(self.subscribers)
+                for sub in subscribers:
+                    sub.buffer.append(packet)
+                next_tick += delay
+                wait = next_tick - time.perf_counter()
+                if wait > 0:
+                    time.sleep(wait)
+                elif wait < -1:
+                    next_tick = time.perf_counter()  # stalled on the network; don't burst to catch up
+        except Exception:
+            log.exception("Station %s pump failed", self.name)
+        finally:
+            self.bot.loop.call_soon_threadsafe(lambda: done.done() or done.set_result(None))
+
+# ==========================
+# Message Manager
+# ==========================
+class NowPlayingMessage:
+    """
+    The guild's single now-playing message. update() only marks it stale; one delayed
+    task renders the latest player state after NP_DEBOUNCE seconds and edits the message
+    in place, so a burst of changes (track change, pause, a Spotify import) is one REST call.
+    """
+    def __init__(self, player):
+        self.player = player
+        self.message = None
+        self._task = None
+        self._dirty = False
+        self._repost = False
+
+    def update(self, *, repost=False):
+        """Schedules a refresh. repost=True moves the message to the bottom of the channel, right away."""
+        if self.message is None and not repost and self.player.current is None:
+            return  # nothing on screen and nothing to announce
+        self._dirty = True
+        self._repost = self._repost or repost
+        if self._task is None or self._task.done():
+            self._task = self.player.bot.loop.create_task(self._flush())
+
+    def close(self):
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    async def _flush(self):
+        while self._dirty:
+            if not self._repost:
+                await asyncio.sleep(NP_DEBOUNCE)
+            self._dirty = False
+            repost, self._repost = self._repost, False
+            try:
+                await self._publish(self.player.now_playing_embed(), repost)
+            except discord.HTTPException as e:
+                log.warning("Now playing update in guild %s failed: %s", self.player._guild.id, e)
+
+    async def _publish(self, embed, repost):
+        view = self.player.cog.controls
+        with EMBED_SEND_SECONDS.time():
+            if self.message and not repost:
+                try:
+                    await self.message.edit(embed=embed, view=view)
+                    return
+                except discord.NotFound:
+                    self.message = None
+            if self.message:
+                try:
+                    await self.message.delete()
+                except discord.HTTPException:
+                    pass
+            self.message = await self.player._channel.send(embed=embed, view=view)
 
 # ==========================
 # Music Player
 # ==========================
 class MusicPlayer:
-    def __init__(self, ctx):
-        self.bot = ctx.bot
-        self._guild = ctx.guild
-        self._channel = ctx.channel
-        self.queue = asyncio.Queue()
+    def __init__(self, bot, guild, channel, cog):
+        self.bot = bot
+        self.cog = cog
+        self._guild = guild
+        self._channel = channel
+        self.queue = TrackQueue()
         self.next = asyncio.Event()
-        self.volume = 0.5
+        self.volume = DEFAULT_VOLUME
+        self.pitch = 1.0
+        self.speed = 1.0
         self.current = None
         self.loop_mode = "off"  # off | one | all
-        self.np_msg = None
+        self.np = NowPlayingMessage(self)
+        self._pages = {}  # page -> rendered queue embed, valid for _pages_version
+        self._pages_version = None
+        self._resolving = {}  # Track -> Task resolving its stream URL
+        self._warm = None  # next track's source, ffmpeg already running
+        self._warm_task = None
+        self._handoff = None  # source the audio thread already switched to
+        self.hub = None  # station this guild is tuned in to, if any
+        self._detached = asyncio.Event()
+        self._detached.set()
+        self._saved_version = None  # queue version in the last snapshot
+        self._saved_state = None
+        # Voice supervision
+        vc = guild.voice_client
+        self.voice_channel_id = vc.channel.id if vc and vc.channel else None  # kept current by the cog's voice listener
+        self.leaving = False  # set once the bot is removed from voice, so that isn't "recovered"
+        self._own_disconnect = False  # ensure_voice is tearing down a stale client itself
+        self._voice_lock = asyncio.Lock()
+        self._interrupted = None  # set by _after when voice dropped or the audio thread failed
+        self._lost_at = None
+        self._recovery = None  # (cause, lost_at) of the track being resumed
 
-        self.bot.loop.create_task(self.player_loop())
+        self._task = self.bot.loop.create_task(self.player_loop())
+        self._task.add_done_callback(self._loop_done)
 
-    async def player_loop(self):
-        await self.bot.wait_until_ready()
-        while not self.bot.is_closed():
-            self.next.clear()
-            try:
-                async with timeout(300):
-                    source = await self.queue.get()
-            except asyncio.TimeoutError:
-                if self._guild.voice_client:
-                    await self._guild.voice_client.disconnect()
-                return
+    def _loop_done(self, task):
+        if not task.cancelled() and task.exception():
+            log.error("Player loop for guild %s crashed", self._guild.id, exc_info=task.exception())
+        self.cog.forget(self)
 
-            self.current = source
-            self._guild.voice_client.play(
-                source,
-                after=lambda e: self.bot.loop.call_soon_threadsafe(self.next.set)
-            )
+    def destroy(self):
+        """Stops the loop and releases the queue, prefetches and current source. Safe to call twice."""
+        self.leaving = True
+        self.cancel_prefetch()
+        self.queue.clear()
+        self.np.close()
+        if not self._task.done():
+            self._task.cancel()
+        self._drop_warm()
+        self.hub = None
+        if self._guild.voice_client:
+            self._guild.voice_client.stop()
+        if self.current:
+            self.current.cleanup()
+            self.current = None
+
+    def prefetch(self):
+        """Resolves stream URLs for the next PREFETCH_DEPTH queued tracks in the background."""
+        for track in self.queue.peek(PREFETCH_DEPTH):
+            if track.is_fresh or track in self._resolving:
+                continue
+            self._resolving[track] = self.bot.loop.create_task(self._resolve(track))
+
+    def cancel_prefetch(self, tracks=None):
+        """Abandons in-flight resolutions (all of them, or just for the given tracks); their workers get recycled."""
+        for track in list(self._resolving) if tracks is None else tracks:
+            task = self._resolving.pop(track, None)
+            if task:
+                task.cancel()
 
-            # Now playing embed
+    async def _resolve(self, track):
+        try:
+            await YTDLSource.resolve(track)
+            # Measured while the current track plays, so the gain is known by the time this one starts
+            YTDLSource.measure(track)
+        except Exception as e:
+            log.warning("Prefetch failed for %r: %s", track.query, e)
+        finally:
+            self._resolving.pop(track, None)
+
+    async def build_source(self, track, *, start=0.0):
+        task = self._resolving.get(track)
+        if task:
+            # wait() never raises, so a prefetch cancelled meanwhile just falls through to a fresh resolve
+            await asyncio.wait([task])
+        return await YTDLSource.from_track(track, volume=self.volume, start=start, pitch=self.pitch, speed=self.speed)
+
+    async def restart(self, position=None):
+        """
+        Swaps in a fresh ffmpeg for the current track at `position` (default: where it is now)
+        with the current filters. Reuses the resolved stream URL or cached file, so no extraction.
+        """
+        old = self.current
+        vc = self._guild.voice_client
+        if not old or not vc:
+            return False
+        position = old.position if position is None else position
+        self._drop_warm()  # built with the old filters
+        new = await self.build_source(old.track, start=position)
+        if self.current is not old:
+            new.cleanup()
+            return False
+        # Mid-crossfade the voice client holds the mixer, and the incoming track's ffmpeg is only
+        # reachable through it; the mixer's cleanup() releases both sides (just `old` after the handoff)
+        retired = vc.source if isinstance(vc.source, CrossfadeSource) else old
+        self._swap_source(vc, new)
+        self.current = new
+        # The audio thread may still be inside old.read(); let it finish before killing ffmpeg
+        self.bot.loop.call_later(0.5, retired.cleanup)
+        self._warm_task = self.bot.loop.create_task(self._prewarm(new))
+        return True
+
+    @staticmethod
+    def _swap_source(vc, source):
+        """
+        vc.source = source, covering what play() would otherwise do: the Opus encoder only
+        exists if the first source was PCM (a passthrough track followed by ?pitch has none),
+        and the audio player's set_source always resumes, so a paused guild is paused again.
+        """
+        if not source.is_opus() and not getattr(vc, "encoder", None):
+            vc.encoder = discord.opus.Encoder()
+        paused = vc.is_paused()
+        vc.source = source
+        if paused:
+            vc.pause()
+
+    # ----------------- Rendering -----------------
+    def now_playing_embed(self):
+        source = self.current
+        if self.hub:
+            playing = self.hub.current
+            embed = discord.Embed(
+                title=f"📻 {self.hub.name}",
+                description=f"[{playing.title}]({playing.url})" if playing else "Tuning in...",
+                color=DEFAULT_COLOR
+            )
+        elif source is None:
+            embed = discord.Embed(
+                title="🎶 Nothing playing",
+                description=f"{len(self.queue)} track(s) queued." if self.queue else "Queue is empty.",
+                color=DEFAULT_COLOR
+            )
+        else:
             embed = discord.Embed(
                 title=f"🎶 Now Playing - {source.title}",
                 description=f"[{source.title}]({source.url})",
                 color=DEFAULT_COLOR
             )
-            embed.set_author(name=self.bot.user.name, icon_url=self.bot.user.display_avatar.url)
             embed.set_thumbnail(url=source.thumbnail)
-            embed.add_field(name="Uploader", value=source.uploader)
-            embed.add_field(name="Duration", value=f"{source.duration // 60}:{source.duration % 60:02}")
-            embed.set_footer(text="Made by Isho")
+            embed.add_field(name="Uploader", value=source.uploader or "Unknown")
+            embed.add_field(name="Duration", value=format_time(source.duration))
+            embed.add_field(name="Loop", value=self.loop_mode)
+            upcoming = self.queue.peek(1)
+            if upcoming:
+                embed.add_field(name="Up Next", value=f"{upcoming[0].title} (+{len(self.queue) - 1} more)", inline=False)
+        embed.set_author(name=self.bot.user.name, icon_url=self.bot.user.display_avatar.url)
+        embed.set_footer(text="Made by Isho")
+        return embed
+
+    def page_count(self):
+        return max(1, -(-len(self.queue) // QUEUE_PAGE_SIZE))
+
+    def queue_page(self, page):
+        """Embed for one queue page (0-based, clamped). Renders are cached until the queue's version changes."""
+        page = min(max(page, 0), self.page_count() - 1)
+        if self._pages_version != self.queue.version:
+            self._pages.clear()
+            self._pages_version = self.queue.version
+        embed = self._pages.get(page)
+        if embed is None:
+            first = page * QUEUE_PAGE_SIZE
+            tracks = islice(self.queue, first, first + QUEUE_PAGE_SIZE)
+            desc = "".join(f"{i}. [{t.title}]({t.url})\n" for i, t in enumerate(tracks, first + 1))
+            embed = discord.Embed(title="🎶 Queue", description=desc or "Queue is empty.", color=DEFAULT_COLOR)
+            embed.set_author(name=self.bot.user.name, icon_url=self.bot.user.display_avatar.url)
+            embed.set_thumbnail(url=self.current.thumbnail if self.current else "")
+            embed.set_footer(text=f"Page {page + 1}/{self.page_count()} | {len(self.queue)} track(s) | Made by Isho")
+            self._pages[page] = embed
+        return embed
+
+    def snapshot(self, store):
+        """Saves descriptors and settings; the queue is only rewritten when it changed since the last snapshot."""
+        vc = self._guild.voice_client
+        if not vc or not vc.channel or self.hub:
+            return  # stations are shared state, not this guild's queue
+        state = {
+            "loop_mode": self.loop_mode,
+            "volume": self.volume,
+            "pitch": self.pitch,
+            "speed": self.speed,
+            "current": self.current.track.to_dict() if self.current else None,
+            "position": round(self.current.position, 2) if self.current else 0.0,
+        }
+        queue = None
+        if self.queue.version != self._saved_version:
+            queue = [t.to_dict() for t in self.queue]
+        elif state == self._saved_state:
+            return
+        store.save(self._guild.id, voice_channel_id=vc.channel.id, text_channel_id=self._channel.id, state=state, queue=queue)
+        self._saved_version = self.queue.version
+        self._saved_state = state
 
-            view = NowPlayingButtons(self)
-            if self.np_msg:
-                try: await self.np_msg.delete()
-                except: pass
-            self.np_msg = await self._channel.send(embed=embed, view=view)
+    # ----------------- Broadcast -----------------
+    def attach(self, hub):
+        """Tunes the guild in to a station. The player's own queue waits until it detaches."""
+        self.detach()
+        self._detached.clear()
+        self._drop_warm()
+        vc = self._guild.voice_client
+        if vc.is_playing() or vc.is_paused():
+            vc.stop()  # the loop finishes the own track as usual, then waits on _detached
+        self.hub = hub
+        # snapshot() skips guilds on a station; drop the old row so a restart doesn't resume a stale queue,
+        # and forget what was saved so the first snapshot after detach() writes the queue in full
+        player_store.delete(self._guild.id)
+        self._saved_version = self._saved_state = None
+        vc.play(hub.subscribe(), after=lambda e: self.bot.loop.call_soon_threadsafe(self._hub_ended, hub))
+        self.np.update()
+
+    def _hub_ended(self, hub):
+        # Something else (skip, disconnect) stopped the station feed
+        if self.hub is hub:
+            self.detach()
+
+    def detach(self):
+        """Leaves the station, if any, and lets the player's own queue continue."""
+        hub, self.hub = self.hub, None
+        vc = self._guild.voice_client
+        if hub and vc:
+            vc.stop()
+        self._detached.set()
+
+    # ----------------- Voice supervision -----------------
+    async def ensure_voice(self):
+        """
+        The connected voice client, reconnecting to the last voice channel if the voice websocket
+        dropped. discord.py gets VOICE_RECONNECT_GRACE seconds to recover it itself (and the
+        gateway time to report a removal, which sets `leaving`); after that the client is rebuilt
+        with exponential backoff. None once it gives up or the bot was removed from voice.
+        """
+        async with self._voice_lock:
+            deadline = time.monotonic() + VOICE_RECONNECT_GRACE
+            while not self.leaving and time.monotonic() < deadline:
+                vc = self._guild.voice_client
+                if vc is not None and vc.is_connected():
+                    return vc
+                await asyncio.sleep(0.25)
+            for attempt in range(VOICE_RECONNECT_ATTEMPTS):
+                vc = self._guild.voice_client
+                if vc is not None and vc.is_connected():
+                    return vc
+                channel = self._guild.get_channel(self.voice_channel_id) if self.voice_channel_id else None
+                if self.leaving or channel is None:
+                    return None
+                if attempt:
+                    delay = min(VOICE_RECONNECT_BACKOFF * 2 ** (attempt - 1), VOICE_RECONNECT_BACKOFF_MAX)
+                    await asyncio.sleep(delay * random.uniform(0.8, 1.2))
+                try:
+                    if vc is not None:
+                        # Half-dead client; connect() refuses while it exists. Its channel-None update isn't a removal
+                        self._own_disconnect = True
+                        await vc.disconnect(force=True)
+                    await channel.connect(timeout=VOICE_CONNECT_TIMEOUT)
+                    VOICE_RECONNECTS.inc(result="ok")
+                    log.info("Reconnected voice in guild %s (attempt %d)", self._guild.id, attempt + 1)
+                except (asyncio.TimeoutError, discord.ClientException, discord.HTTPException, OSError) as e:
+                    VOICE_RECONNECTS.inc(result="failed")
+                    log.warning("Voice reconnect in guild %s failed (attempt %d): %s", self._guild.id, attempt + 1, e)
+            vc = self._guild.voice_client
+            if vc is not None and vc.is_connected():
+                return vc
+            VOICE_RECONNECTS.inc(result="gave_up")
+            return None
+
+    def _interruption(self, finished, interrupted):
+        """Why `finished` stopped early ("voice" or "stream"), or None if it ended, was skipped or we're leaving."""
+        if self.leaving or finished.track.recoveries >= MAX_TRACK_RECOVERIES:
+            return None
+        if interrupted:
+            return "voice"
+        # frames: a resume that gets no audio at all is a track shorter than its listed duration
+        if finished.reached_eof and finished.frames and finished.duration and not finished.data.get("is_live") \
+                and finished.duration - finished.position > STREAM_END_SLACK:
+            return "stream"
+        return None
+
+    # ----------------- Gapless handoff -----------------
+    def _next_track(self):
+        """The track that will play after the current one, given the loop mode; None if nothing is queued."""
+        current = self.current.track if self.current else None
+        if self.loop_mode == "one":
+            return current
+        if self.queue:
+            return self.queue[0]
+        return current if self.loop_mode == "all" else None
+
+    def _drop_warm(self):
+        if self._warm_task and not self._warm_task.done():
+            self._warm_task.cancel()
+        warm, self._warm = self._warm, None
+        if warm:
+            warm.cleanup()
+
+    async def _prewarm(self, source):
+        """Spawns the next track's ffmpeg PREWARM_SECONDS before `source` ends, and starts the crossfade if enabled."""
+        if not source.duration:
+            return
+        lead = max(PREWARM_SECONDS, CROSSFADE_SECONDS)
+        # Position comes from frames read, so pauses simply stretch the wait
+        while self.current is source and source.remaining > lead:
+            await asyncio.sleep(min(source.remaining - lead, 5))
+        track = self._next_track()
+        if track is None or self.current is not source:
+            return
+        try:
+            warm = await self.build_source(track)
+        except Exception as e:
+            log.warning("Pre-warm failed for %r: %s", track.query, e)
+            return
+        if self.current is not source or self._next_track() is not track:
+            return warm.cleanup()
+        self._warm = warm
+
+        if CROSSFADE_SECONDS <= 0 or source.is_opus() or warm.is_opus():
+            return
+        while self.current is source and source.remaining > CROSSFADE_SECONDS:
+            await asyncio.sleep(0.2)
+        vc = self._guild.voice_client
+        # After a previous crossfade the voice client still holds that (now pass-through) mixer
+        playing = getattr(vc.source, "incoming", vc.source) if vc else None
+        if self._warm is warm and playing is source:
+            self._warm = None
+            vc.source = CrossfadeSource(source, warm, frames=int(source.remaining / 0.02), on_handoff=self._crossfaded)
+
+    def _crossfaded(self, incoming):
+        # Audio thread: the mixer already plays `incoming`, just tell the loop
+        self._handoff = incoming
+        self.bot.loop.call_soon_threadsafe(self.next.set)
+
+    def _after(self, error):
+        # Audio thread: start the pre-warmed source right here so there's no gap while the loop wakes up
+        warm, self._warm = self._warm, None
+        vc = self._guild.voice_client
+        connected = vc is not None and vc.is_connected()
+        if error is not None or not connected:
+            # Voice dropped or the audio thread failed: the loop resumes the track instead of moving on
+            self._interrupted = error or "voice disconnected"
+            self._lost_at = time.perf_counter()
+            log.warning("Playback interrupted in guild %s: %s", self._guild.id, self._interrupted)
+        if warm:
+            if error is None and connected and self._next_track() is warm.track:
+                try:
+                    vc.play(warm, after=self._after)
+                    self._handoff = warm
+                except Exception as e:
+                    log.warning("Gapless handoff failed: %s", e)
+                    warm.cleanup()
+            else:
+                warm.cleanup()
+        self.bot.loop.call_soon_threadsafe(self.next.set)
+
+    async def player_loop(self):
+        await self.bot.wait_until_ready()
+        while not self.bot.is_closed():
+            await self._detached.wait()
+            self.next.clear()
+            if self._handoff:
+                source, self._handoff = self._handoff, None
+            else:
+                try:
+                    async with timeout(300):
+                        with QUEUE_WAIT_SECONDS.time():
+                            track = await self.queue.get()
+                except asyncio.TimeoutError:
+                    self.leaving = True
+                    if self._guild.voice_client:
+                        await self._guild.voice_client.disconnect()
+                    return
+
+                dequeued = time.perf_counter()
+                start, track.resume_at = track.resume_at, 0.0
+                try:
+                    source = await self.build_source(track, start=start)
+                except Exception as e:
+                    await self._channel.send(embed=discord.Embed(
+                        description=f"❌ Could not play **{track.title}**: {e}", color=DEFAULT_COLOR))
+                    continue
+                if not self._detached.is_set():
+                    # Tuned in to a station meanwhile; keep the track for later
+                    source.cleanup()
+                    self.queue.push_front(track)
+                    continue
+                vc = await self.ensure_voice()
+                if vc is None:
+                    source.cleanup()
+                    track.resume_at = start
+                    self.queue.push_front(track)
+                    if not self.leaving:
+                        self.leaving = True
+                        await self._channel.send(embed=discord.Embed(
+                            description="⚠️ Lost the voice connection and could not reconnect.", color=DEFAULT_COLOR))
+                    return
+                source.first_audio_from = dequeued
+                try:
+                    vc.play(source, after=self._after)
+                except discord.ClientException as e:
+                    # Dropped again between the check and play(); the next pass reconnects
+                    log.warning("Could not start playback in guild %s: %s", self._guild.id, e)
+                    source.cleanup()
+                    track.resume_at = start
+                    self.queue.push_front(track)
+                    await asyncio.sleep(1)
+                    continue
+                if self._recovery:
+                    cause, lost_at = self._recovery
+                    self._recovery = None
+                    PLAYBACK_RECOVERIES.inc(cause=cause)
+                    RECOVERY_SECONDS.observe(time.perf_counter() - lost_at)
+
+            self.current = source
+            self.prefetch()
+            self._warm_task = self.bot.loop.create_task(self._prewarm(source))
+
+            self.np.update()
+            # First plays (nothing was prefetched) get measured now and normalized from the next play on
+            YTDLSource.measure(source.track)
+            if self.cog.lyrics:
+                # So ?lyrics for this track answers from cache
+                self.cog.lyrics.prefetch(source.title)
 
             await self.next.wait()
             finished = self.current
             self.current = None
+            interrupted, self._interrupted = self._interrupted, None
+            if not self._handoff:
+                self._drop_warm()
 
-            if self.loop_mode == "one":
-                repeat_src = await YTDLSource.create_source(finished.url, loop=self.bot.loop, volume=self.volume)
-                self.queue._queue.appendleft(repeat_src)
-            elif self.loop_mode == "all":
-                repeat_src = await YTDLSource.create_source(finished.url, loop=self.bot.loop, volume=self.volume)
-                await self.queue.put(repeat_src)
+            cause = self._interruption(finished, interrupted)
+            if cause:
+                # Same descriptor, same offset: a voice drop keeps the stream URL (or cached file),
+                # a broken stream gets a fresh URL
+                track = finished.track
+                track.recoveries += 1
+                track.resume_at = finished.position
+                if cause == "stream":
+                    track.expires_at = 0.0
+                self._recovery = (cause, self._lost_at if cause == "voice" and self._lost_at else time.perf_counter())
+                self.queue.push_front(track)
+                log.info("Resuming %r at %.1fs in guild %s (%s)", track.title, track.resume_at, self._guild.id, cause)
+                finished.cleanup()
+                continue
+            finished.track.recoveries = 0
+
+            # The audio thread may already be playing the next track; bring the queue in line with that
+            handoff_track = self._handoff.track if self._handoff else None
+            if handoff_track is not None and handoff_track is not finished.track:
+                self.queue.discard(handoff_track)
+            # Re-queue the descriptor; its stream URL is reused while still fresh
+            if handoff_track is not finished.track:
+                if self.loop_mode == "one":
+                    self.queue.push_front(finished.track)
+                elif self.loop_mode == "all":
+                    self.queue.put(finished.track)
 
             finished.cleanup()
+            self.np.update()
 
 # ==========================
 # Buttons
 # ==========================
-class NowPlayingButtons(discord.ui.View):
-    def __init__(self, player):
+class PlayerControls(discord.ui.View):
+    """
+    Buttons under every now-playing message. Registered once with bot.add_view: the
+    stable custom_ids let this one instance serve every guild's message (and survive
+    restarts), so each callback looks the player up from the interaction.
+    """
+    def __init__(self, cog):
         super().__init__(timeout=None)
-        self.player = player
+        self.cog = cog
+
+    async def _player(self, interaction):
+        player = self.cog.players.get(interaction.guild_id)
+        if player is None or interaction.guild.voice_client is None:
+            await interaction.response.send_message("⚠️ Not connected.", ephemeral=True)
+            return None
+        return player
 
-    @discord.ui.button(label="⏭ Skip", style=discord.ButtonStyle.green)
+    @discord.ui.button(label="⏭ Skip", style=discord.ButtonStyle.green, custom_id="kz:np:skip")
     async def skip(self, interaction: discord.Interaction, button: discord.ui.Button):
-        vc = self.player._guild.voice_client
-        if not vc or not vc.is_playing():
+        player = await self._player(interaction)
+        if player is None:
+            return
+        vc = interaction.guild.voice_client
+        if not vc.is_playing():
             return await interaction.response.send_message("⚠️ Nothing is playing.", ephemeral=True)
         vc.stop()
         await interaction.response.send_message("⏭ Skipped!", ephemeral=True)
 
-    @discord.ui.button(label="⏸ Pause/▶ Resume", style=discord.ButtonStyle.blurple)
+    @discord.ui.button(label="⏸ Pause/▶ Resume", style=discord.ButtonStyle.blurple, custom_id="kz:np:pause")
     async def pause_resume(self, interaction: discord.Interaction, button: discord.ui.Button):
-        vc = self.player._guild.voice_client
-        if not vc:
-            return await interaction.response.send_message("⚠️ Not connected.", ephemeral=True)
+        player = await self._player(interaction)
+        if player is None:
+            return
+        vc = interaction.guild.voice_client
         if vc.is_playing():
             vc.pause()
             await interaction.response.send_message("⏸ Paused!", ephemeral=True)
         elif vc.is_paused():
             vc.resume()
             await interaction.response.send_message("▶ Resumed!", ephemeral=True)
+        else:
+            await interaction.response.send_message("⚠️ Nothing is playing.", ephemeral=True)
 
-    @discord.ui.button(label="🔁 Loop", style=discord.ButtonStyle.grey)
+    @discord.ui.button(label="🔁 Loop", style=discord.ButtonStyle.grey, custom_id="kz:np:loop")
     async def loop(self, interaction: discord.Interaction, button: discord.ui.Button):
+        player = await self._player(interaction)
+        if player is None:
+            return
         modes = ["off", "one", "all"]
-        idx = modes.index(self.player.loop_mode)
-        self.player.loop_mode = modes[(idx + 1) % len(modes)]
-        await interaction.response.send_message(f"Loop mode: {self.player.loop_mode}", ephemeral=True)
+        player.loop_mode = modes[(modes.index(player.loop_mode) + 1) % len(modes)]
+        player.np.update()
+        await interaction.response.send_message(f"Loop mode: {player.loop_mode}", ephemeral=True)
+
+    @discord.ui.button(label="📜 Queue", style=discord.ButtonStyle.secondary, custom_id="kz:np:queue")
+    async def show_queue(self, interaction: discord.Interaction, button: discord.ui.Button):
+        player = await self._player(interaction)
+        if player is None:
+            return
+        await interaction.response.send_message(embed=player.queue_page(0), view=self.cog.queue_controls, ephemeral=True)
 
-class NowPlayingView(discord.ui.View):
-    def __init__(self, bot, ctx):
+class QueueControls(discord.ui.View):
+    """Page and edit buttons for queue messages; persistent like PlayerControls, the page is read back from the footer."""
+    def __init__(self, cog):
         super().__init__(timeout=None)
-        self.bot = bot
-        self.ctx = ctx
+        self.cog = cog
 
-    @discord.ui.button(label="⏯️ Pause/Resume", style=discord.ButtonStyle.primary)
-    async def pause_resume(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.ctx.invoke(self.bot.get_command("pause"))
+    @staticmethod
+    def _page(interaction):
+        embeds = interaction.message.embeds if interaction.message else []
+        match = PAGE_RE.search(embeds[0].footer.text or "") if embeds and embeds[0].footer else None
+        return int(match.group(1)) - 1 if match else 0
 
-    @discord.ui.button(label="⏭️ Skip", style=discord.ButtonStyle.danger)
-    async def skip(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.ctx.invoke(self.bot.get_command("skip"))
+    async def _show(self, interaction, page, edit=None):
+        player = self.cog.players.get(interaction.guild_id)
+        if player is None:
+            return await interaction.response.send_message("⚠️ Queue is empty.", ephemeral=True)
+        if edit:
+            edit(player)
+        await interaction.response.edit_message(embed=player.queue_page(page), view=self)
 
-    @discord.ui.button(label="📜 Queue", style=discord.ButtonStyle.secondary)
-    async def show_queue(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.ctx.invoke(self.bot.get_command("queue"))
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary, custom_id="kz:queue:prev")
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self._page(interaction) - 1)
 
-class QueueView(discord.ui.View):
-    def __init__(self, bot, ctx):
-        super().__init__(timeout=None)
-        self.bot = bot
-        self.ctx = ctx
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary, custom_id="kz:queue:next")
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self._page(interaction) + 1)
 
-    @discord.ui.button(label="🔀 Shuffle", style=discord.ButtonStyle.success)
+    @discord.ui.button(label="🔀 Shuffle", style=discord.ButtonStyle.success, custom_id="kz:queue:shuffle")
     async def shuffle_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.ctx.invoke(self.bot.get_command("shuffle"))
+        def shuffle(player):
+            player.queue.shuffle()
+            player.prefetch()
+            player.np.update()
+        await self._show(interaction, 0, shuffle)
 
-    @discord.ui.button(label="🗑️ Clear Queue", style=discord.ButtonStyle.danger)
+    @discord.ui.button(label="🗑️ Clear Queue", style=discord.ButtonStyle.danger, custom_id="kz:queue:clear")
     async def clear_queue(self, interaction: discord.Interaction, button: discord.ui.Button):
-        await self.ctx.invoke(self.bot.get_command("clearqueue"))
+        def clear(player):
+            player.queue.clear()
+            player.cancel_prefetch()
+            player.np.update()
+        await self._show(interaction, 0, clear)
+
+class LyricsPages(discord.ui.View):
+    """Pages through one song's lyrics; the pages live on the view, so it expires with it."""
+    def __init__(self, bot, title, pages):
+        super().__init__(timeout=600)
+        self.bot = bot
+        self.title = title
+        self.pages = pages
+        self.page = 0
+        self.message = None
+
+    def embed(self):
+        embed = discord.Embed(title=f"🎤 Lyrics - {self.title}", description=self.pages[self.page], color=DEFAULT_COLOR)
+        embed.set_author(name=self.bot.user.name, icon_url=self.bot.user.display_avatar.url)
+        embed.set_footer(text=f"Page {self.page + 1}/{len(self.pages)} | Made by Isho" if len(self.pages) > 1 else "Made by Isho")
+        return embed
+
+    async def _turn(self, interaction, step):
+        self.page = (self.page + step) % len(self.pages)
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, -1)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._turn(interaction, 1)
+
+    async def on_timeout(self):
+        if self.message:
+            try:
+                await self.message.edit(view=None)
+            except discord.HTTPException:
+                pass
 
 # ==========================
 # Music Cog
@@ -228,13 +1457,170 @@ class Music(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.players = {}
+        self.hubs = {}  # station name -> BroadcastHub
+        self.spotify = SpotifyClient.from_env()
+        self.genius = GeniusClient.from_env()
+        self.lyrics = LyricsService(self.genius, LYRICS_CACHE_PATH) if self.genius else None
+        self.metrics_server = MetricsServer(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+        REGISTRY.gauge("kz_players", "Music players alive", fn=lambda: len(self.players))
+        REGISTRY.gauge("kz_players_playing", "Players with a current track", fn=lambda: sum(1 for p in self.players.values() if p.current))
+        REGISTRY.gauge("kz_stations", "Live broadcast stations", fn=lambda: len(self.hubs))
+        self._restored = False
+        self.controls = PlayerControls(self)
+        self.queue_controls = QueueControls(self)
+
+    async def cog_load(self):
+        if self.metrics_server:
+            try:
+                await self.metrics_server.start()
+            except OSError as e:
+                log.warning("Metrics endpoint on port %s unavailable: %s", METRICS_PORT, e)
+                self.metrics_server = None
+        # Registered once; every now-playing and queue message reuses these two instances
+        self.bot.add_view(self.controls)
+        self.bot.add_view(self.queue_controls)
+        self.snapshot_players.start()
+
+    async def cog_unload(self):
+        self.snapshot_players.cancel()
+        for player in list(self.players.values()):
+            # Last snapshot (exact position) before teardown; the rows stay so the next start can resume
+            self._snapshot(player)
+            self.forget(player)
+        for hub in list(self.hubs.values()):
+            hub.close()
+        self.hubs.clear()
+        shutdown_executor()
+        await extractor.close()
+        if loudness:
+            loudness.close()
+        if self.metrics_server:
+            await self.metrics_server.stop()
+
+    async def cog_check(self, ctx):
+        # Slash commands can be used in DMs; nothing here works without a guild
+        return ctx.guild is not None
 
     def get_player(self, ctx):
-        return self.players.setdefault(ctx.guild.id, MusicPlayer(ctx))
+        """Returns the guild's player, creating it (and its loop task) only if there isn't one yet."""
+        player = self.players.get(ctx.guild.id)
+        if player is None:
+            player = self.players[ctx.guild.id] = MusicPlayer(self.bot, ctx.guild, ctx.channel, self)
+        return player
+
+    def shard_players(self, shard_id):
+        """Players of guilds served by one shard. Guild ids are unique across shards, so one dict serves them all."""
+        return [p for p in self.players.values() if p._guild.shard_id == shard_id]
+
+    @commands.Cog.listener()
+    async def on_shard_disconnect(self, shard_id):
+        log.info("Shard %s disconnected with %d active player(s)", shard_id, len(self.shard_players(shard_id)))
+
+    def forget(self, player):
+        """Drops a player from the registry and tears it down; called when its loop exits or voice disconnects."""
+        if self.players.get(player._guild.id) is player:
+            del self.players[player._guild.id]
+        player.destroy()
+
+    # ----------------- Persistence -----------------
+    def _snapshot(self, player):
+        try:
+            player.snapshot(player_store)
+        except Exception as e:
+            log.warning("Snapshot of guild %s failed: %s", player._guild.id, e)
+
+    @tasks.loop(seconds=PLAYER_SNAPSHOT_INTERVAL)
+    async def snapshot_players(self):
+        for player in list(self.players.values()):
+            self._snapshot(player)
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # on_ready fires again after a full reconnect; only the first one restores
+        if self._restored:
+            return
+        self._restored = True
+        sem = asyncio.Semaphore(RESTORE_CONCURRENCY)
+
+        async def bounded(snap):
+            async with sem:
+                try:
+                    await self.restore_player(snap)
+                except Exception as e:
+                    log.warning("Could not restore player for guild %s: %s", snap["guild_id"], e)
+                    player_store.delete(snap["guild_id"])
+
+        await asyncio.gather(*(bounded(s) for s in player_store.load_all(max_age=PLAYER_STATE_MAX_AGE)))
+
+    async def restore_player(self, snap):
+        """
+        Rejoins the saved voice channel and rebuilds the queue from descriptors. Nothing is
+        extracted up front: the loop resolves the interrupted track (starting at its saved
+        offset) and prefetch handles the next few, exactly as for a fresh queue.
+        """
+        guild = self.bot.get_guild(snap["guild_id"])
+        if guild is None or guild.id in self.players:
+            return  # a guild served by another shard process, or already playing again
+        voice = guild.get_channel(snap["voice_channel_id"])
+        text = guild.get_channel(snap["text_channel_id"])
+        state = snap["state"]
+        tracks = [Track.from_dict(d) for d in snap["queue"]]
+        current = Track.from_dict(state["current"]) if state.get("current") else None
+        if voice is None or text is None or not (tracks or current):
+            return player_store.delete(guild.id)
+
+        if guild.voice_client is None:
+            await voice.connect()
+        player = self.players[guild.id] = MusicPlayer(self.bot, guild, text, self)
+        player.loop_mode = state.get("loop_mode", "off")
+        player.volume = state.get("volume", DEFAULT_VOLUME)
+        player.pitch = state.get("pitch", 1.0)
+        player.speed = state.get("speed", 1.0)
+        if current:
+            current.resume_at = state.get("position", 0.0)
+            player.queue.put(current)
+        player.queue.extend(tracks)
+        log.info("Restored player for guild %s with %d track(s)", guild.id, len(player.queue))
+
+    def hub_track_changed(self, hub):
+        """Refreshes the now-playing message of every guild tuned in to the station."""
+        for player in self.players.values():
+            if player.hub is hub:
+                player.np.update()
+
+    def close_hub(self, hub):
+        """Called once a station's last listener leaves."""
+        if hub.subscribers:
+            return  # someone tuned in again before this ran
+        if self.hubs.get(hub.name) is hub:
+            del self.hubs[hub.name]
+        hub.close()
+
+    @commands.Cog.listener()
+    async def on_voice_state_update(self, member, before, after):
+        if member.id != self.bot.user.id:
+            return
+        player = self.players.get(member.guild.id)
+        if after.channel is not None:
+            if player:
+                player.voice_channel_id = after.channel.id  # joined, was moved or reconnected
+                player._own_disconnect = False
+            return
+        if player and player._own_disconnect:
+            player._own_disconnect = False
+            return
+        # Removed from voice (?disconnect, idle timeout, a moderator's Disconnect, channel deleted) is final.
+        # Websocket-level drops send no such update; the player loop reconnects those (MusicPlayer.ensure_voice)
+        player_store.delete(member.guild.id)
+        if player:
+            player.leaving = True
+            player.voice_channel_id = None
+            self.forget(player)
 
     # ----------------- JOIN / CONNECT -----------------
-    @commands.command(name="join", aliases=["connect", "joinvc"])
+    @commands.hybrid_command(name="join", aliases=["connect", "joinvc"], description="Join your voice channel")
     async def join_command(self, ctx):
+        await ctx.defer()
         if ctx.author.voice is None:
             return await ctx.send(embed=discord.Embed(description="⚠️ You must be in a voice channel.", color=DEFAULT_COLOR))
         if ctx.voice_client is not None:
@@ -243,16 +1629,20 @@ class Music(commands.Cog):
         await ctx.send(embed=discord.Embed(description=f"✅ Connected to {ctx.author.voice.channel.name}", color=DEFAULT_COLOR))
 
     # ----------------- DISCONNECT / LEAVE -----------------
-    @commands.command(name="disconnect", aliases=["leave"])
+    @commands.hybrid_command(name="disconnect", aliases=["leave"], description="Leave the voice channel")
     async def disconnect(self, ctx):
         if ctx.voice_client is None:
             return await ctx.send(embed=discord.Embed(description="⚠️ Not connected.", color=DEFAULT_COLOR))
+        player = self.players.get(ctx.guild.id)
+        if player:
+            player.leaving = True
         await ctx.voice_client.disconnect()
         await ctx.send(embed=discord.Embed(description="✅ Disconnected.", color=DEFAULT_COLOR))
 
     # ----------------- PLAY -----------------
-    @commands.command(name="play", aliases=["p"])
+    @commands.hybrid_command(name="play", aliases=["p"], description="Play a song or a Spotify link")
     async def play_command(self, ctx, *, query: str):
+        await ctx.defer()
         if ctx.author.voice is None:
             return await ctx.send(embed=discord.Embed(description="⚠️ You must be in a voice channel.", color=DEFAULT_COLOR))
         if ctx.voice_client is None:
@@ -261,28 +1651,43 @@ class Music(commands.Cog):
         loading_msg = await ctx.send(embed=discord.Embed(description=f"🔍 Searching for **{query}** ...", color=DEFAULT_COLOR))
         try:
             if is_spotify_link(query):
-                urls = await fetch_youtube_links_from_spotify(query)
+                if self.spotify is None:
+                    return await loading_msg.edit(embed=discord.Embed(description="⚠️ Spotify API not configured.", color=DEFAULT_COLOR))
                 added_tracks = []
-                for track in urls:
-                    source = await YTDLSource.create_source(track, loop=self.bot.loop)
-                    await player.queue.put(source)
-                    added_tracks.append(f"[{source.title}]({source.url})")
+                last_edit = time.monotonic()
+                async for batch, total in iter_spotify_tracks(self.spotify, query):
+                    player.queue.extend(batch)
+                    added_tracks.extend(batch)
+                    player.prefetch()
+                    player.np.update()
+                    if time.monotonic() - last_edit >= PROGRESS_EDIT_INTERVAL:
+                        last_edit = time.monotonic()
+                        await loading_msg.edit(embed=discord.Embed(
+                            description=f"📥 Importing from Spotify... {len(added_tracks)}/{total} track(s) queued",
+                            color=DEFAULT_COLOR
+                        ))
+                lines = [f"[{t.title}]({t.url})" for t in added_tracks[:10]]
+                if len(added_tracks) > 10:
+                    lines.append(f"...and {len(added_tracks) - 10} more")
                 await loading_msg.edit(embed=discord.Embed(
-                    description=f"✅ Added {len(added_tracks)} track(s) from Spotify to queue:\n" + "\n".join(added_tracks),
+                    description=f"✅ Added {len(added_tracks)} track(s) from Spotify to queue:\n" + "\n".join(lines),
                     color=DEFAULT_COLOR
                 ))
             else:
-                source = await YTDLSource.create_source(query, loop=self.bot.loop)
-                await player.queue.put(source)
+                data = await YTDLSource.extract(query, need_stream=False)
+                track = Track.from_data(data, query=query)
+                player.queue.put(track)
+                player.prefetch()
+                player.np.update()
                 await loading_msg.edit(embed=discord.Embed(
-                    description=f"✅ Added to queue: **[{source.title}]({source.url})**",
+                    description=f"✅ Added to queue: **[{track.title}]({track.url})**",
                     color=DEFAULT_COLOR
                 ))
         except Exception as e:
             await loading_msg.edit(embed=discord.Embed(description=f"❌ Error while processing: {e}", color=DEFAULT_COLOR))
 
     # ----------------- PAUSE / RESUME -----------------
-    @commands.command(name="pause")
+    @commands.hybrid_command(name="pause", description="Pause the current track")
     async def pause(self, ctx):
         vc = ctx.voice_client
         if not vc or not vc.is_playing():
@@ -290,7 +1695,7 @@ class Music(commands.Cog):
         vc.pause()
         await ctx.send(embed=discord.Embed(description="⏸ Paused!", color=DEFAULT_COLOR))
 
-    @commands.command(name="resume")
+    @commands.hybrid_command(name="resume", description="Resume the paused track")
     async def resume(self, ctx):
         vc = ctx.voice_client
         if not vc or not vc.is_paused():
@@ -299,7 +1704,7 @@ class Music(commands.Cog):
         await ctx.send(embed=discord.Embed(description="▶ Resumed!", color=DEFAULT_COLOR))
 
     # ----------------- SKIP -----------------
-    @commands.command(name="skip")
+    @commands.hybrid_command(name="skip", description="Skip the current track")
     async def skip(self, ctx):
         vc = ctx.voice_client
         if not vc or not vc.is_playing():
@@ -308,80 +1713,61 @@ class Music(commands.Cog):
         await ctx.send(embed=discord.Embed(description="⏭ Skipped!", color=DEFAULT_COLOR))
 
     # ----------------- QUEUE -----------------
-    @commands.command(name="queue")
-    async def queue_command(self, ctx):
-        player = self.get_player(ctx)
-        if player.queue.empty():
+    @commands.hybrid_command(name="queue", description="Show the queue")
+    async def queue_command(self, ctx, page: int = 1):
+        player = self.players.get(ctx.guild.id)
+        if player is None or player.queue.empty():
             return await ctx.send(embed=discord.Embed(description="⚠️ Queue is empty.", color=DEFAULT_COLOR))
-        qlist = list(player.queue._queue)
-        desc = ""
-        view = QueueView(self.bot, ctx)
-        await ctx.send(embed=embed, view=view)
-        for i, s in enumerate(qlist, 1):
-            desc += f"{i}. [{s.title}]({s.url})\n"
-        embed = discord.Embed(title="🎶 Queue", description=desc, color=DEFAULT_COLOR)
-        embed.set_author(name=self.bot.user.name, icon_url=self.bot.user.display_avatar.url)
-        embed.set_thumbnail(url=player.current.thumbnail if player.current else "")
-        embed.set_footer(text="Made by Isho")
-        await ctx.send(embed=embed)
+        await ctx.send(embed=player.queue_page(page - 1), view=self.queue_controls)
 
     # ----------------- REMOVE -----------------
-    @commands.command(name="remove")
+    @commands.hybrid_command(name="remove", description="Remove a track from the queue")
     async def remove(self, ctx, position: int):
-        player = self.get_player(ctx)
-        qlist = list(player.queue._queue)
-        if position < 1 or position > len(qlist):
+        player = self.players.get(ctx.guild.id)
+        if player is None or position < 1 or position > len(player.queue):
             return await ctx.send(embed=discord.Embed(description="⚠️ Invalid position.", color=DEFAULT_COLOR))
-        removed = qlist.pop(position - 1)
-        player.queue._queue = asyncio.Queue()
-        for item in qlist:
-            await player.queue.put(item)
+        removed = player.queue.remove(position - 1)
+        player.cancel_prefetch([removed])
+        player.prefetch()
+        player.np.update()
         await ctx.send(embed=discord.Embed(description=f"❌ Removed **{removed.title}** from the queue.", color=DEFAULT_COLOR))
 
     # ----------------- MOVE -----------------
-    @commands.command(name="move")
+    @commands.hybrid_command(name="move", description="Move a track in the queue")
     async def move(self, ctx, old_pos: int, new_pos: int):
-        player = self.get_player(ctx)
-        qlist = list(player.queue._queue)
-        if old_pos < 1 or old_pos > len(qlist) or new_pos < 1 or new_pos > len(qlist):
+        player = self.players.get(ctx.guild.id)
+        size = len(player.queue) if player else 0
+        if old_pos < 1 or old_pos > size or new_pos < 1 or new_pos > size:
             return await ctx.send(embed=discord.Embed(description="⚠️ Invalid positions.", color=DEFAULT_COLOR))
-        item = qlist.pop(old_pos - 1)
-        qlist.insert(new_pos - 1, item)
-        player.queue._queue = asyncio.Queue()
-        for s in qlist:
-            await player.queue.put(s)
+        item = player.queue.move(old_pos - 1, new_pos - 1)
+        player.prefetch()
+        player.np.update()
         await ctx.send(embed=discord.Embed(description=f"✅ Moved **{item.title}** to position {new_pos}.", color=DEFAULT_COLOR))
 
     # ----------------- CLEARQUEUE -----------------
-    @commands.command(name="clearqueue")
+    @commands.hybrid_command(name="clearqueue", description="Clear all queued songs")
     async def clearqueue(self, ctx):
-        player = self.get_player(ctx)
-        while not player.queue.empty():
-            await player.queue.get()
+        player = self.players.get(ctx.guild.id)
+        if player:
+            player.queue.clear()
+            player.cancel_prefetch()
+            player.np.update()
         await ctx.send(embed=discord.Embed(description="🗑 Cleared the queue.", color=DEFAULT_COLOR))
 
     # ----------------- NOW PLAYING -----------------
-    @commands.command(name="nowplaying", aliases=["np"])
+    @commands.hybrid_command(name="nowplaying", aliases=["np"], description="Show the now playing message")
     async def nowplaying(self, ctx):
-        player = self.get_player(ctx)
-        if not player.current:
+        player = self.players.get(ctx.guild.id)
+        if player is None or not (player.current or player.hub):
             return await ctx.send(embed=discord.Embed(description="⚠️ Nothing is playing.", color=DEFAULT_COLOR))
-        src = player.current
-        embed = discord.Embed(
-            title=f"🎶 Now Playing - {src.title}",
-            description=f"[{src.title}]({src.url})",
-            color=DEFAULT_COLOR
-        )
-        view = NowPlayingView(self.bot, ctx)
-        await ctx.send(embed=embed, view=view)
-        embed.set_author(name=self.bot.user.name, icon_url=self.bot.user.display_avatar.url)
-        embed.set_thumbnail(url=src.thumbnail)
-        embed.add_field(name="Uploader", value=src.uploader)
-        embed.add_field(name="Duration", value=f"{src.duration // 60}:{src.duration % 60:02}")
-        embed.set_footer(text="Made by Isho")
-        await ctx.send(embed=embed)
+        # Moves the guild's one now-playing message down here instead of adding another
+        player.np.update(repost=True)
+        if ctx.interaction:
+            # The repost goes through the channel, so the interaction itself still needs an answer
+            await ctx.send(embed=discord.Embed(description="🎶 Now playing message moved down.", color=DEFAULT_COLOR), ephemeral=True)
+
     # ----------------- LOOP -----------------
-    @commands.command(name="loop")
+    @commands.hybrid_command(name="loop", description="Set the loop mode (off, one, all)")
     async def loop(self, ctx, mode: str = None):
         player = self.get_player(ctx)
         modes = ["off", "one", "all"]
@@ -390,67 +1776,187 @@ class Music(commands.Cog):
         if mode.lower() not in modes:
             return await ctx.send(embed=discord.Embed(description="⚠️ Invalid mode. Choose `off`, `one`, or `all`.", color=DEFAULT_COLOR))
         player.loop_mode = mode.lower()
+        player.np.update()
         await ctx.send(embed=discord.Embed(description=f"🔁 Loop mode set to `{player.loop_mode}`", color=DEFAULT_COLOR))
 
     # ----------------- SHUFFLE -----------------
-    @commands.command(name="shuffle")
+    @commands.hybrid_command(name="shuffle", description="Shuffle the queue")
     async def shuffle(self, ctx):
-        import random
-        player = self.get_player(ctx)
-        qlist = list(player.queue._queue)
-        random.shuffle(qlist)
-        player.queue._queue = asyncio.Queue()
-        for s in qlist:
-            await player.queue.put(s)
+        player = self.players.get(ctx.guild.id)
+        if player:
+            player.queue.shuffle()
+            player.prefetch()
+            player.np.update()
         await ctx.send(embed=discord.Embed(description="🔀 Queue shuffled.", color=DEFAULT_COLOR))
 
     # ----------------- LYRICS -----------------
-    @commands.command(name="lyrics")
+    @commands.hybrid_command(name="lyrics", description="Fetch lyrics for a song or the current track")
     async def lyrics(self, ctx, *, query: str = None):
-        if genius is None:
+        await ctx.defer()
+        if self.lyrics is None:
             return await ctx.send(embed=discord.Embed(description="⚠️ Genius API not configured.", color=DEFAULT_COLOR))
-        player = self.get_player(ctx)
+        player = self.players.get(ctx.guild.id)
         if query is None:
-            if not player.current:
+            if player is None or not player.current:
                 return await ctx.send(embed=discord.Embed(description="⚠️ Nothing is playing.", color=DEFAULT_COLOR))
             query = player.current.title
-        await ctx.send(embed=discord.Embed(description=f"🔍 Searching lyrics for **{query}** ...", color=DEFAULT_COLOR))
-        try:
-            song = genius.search_song(query)
-        except Exception as e:
-            return await ctx.send(embed=discord.Embed(description=f"❌ Failed to fetch lyrics: {e}", color=DEFAULT_COLOR))
+        hit, song = self.lyrics.cached(query)
+        if not hit:
+            await ctx.send(embed=discord.Embed(description=f"🔍 Searching lyrics for **{query}** ...", color=DEFAULT_COLOR))
+            try:
+                song = await self.lyrics.get(query)
+            except Exception as e:
+                return await ctx.send(embed=discord.Embed(description=f"❌ Failed to fetch lyrics: {e}", color=DEFAULT_COLOR))
         if not song:
             return await ctx.send(embed=discord.Embed(description=f"⚠️ No lyrics found for **{query}**", color=DEFAULT_COLOR))
-        embed = discord.Embed(title=f"🎤 Lyrics - {song.title}", description=song.lyrics, color=DEFAULT_COLOR)
-        embed.set_author(name=self.bot.user.name, icon_url=self.bot.user.display_avatar.url)
-        embed.set_footer(text="Made by Isho")
-        await ctx.send(embed=embed)
+        pages = split_pages(song.text)
+        view = LyricsPages(self.bot, song.title, pages)
+        view.message = await ctx.send(embed=view.embed(), view=view if len(pages) > 1 else None)
+
+    # ----------------- SEEK -----------------
+    @commands.hybrid_command(name="seek", description="Jump to a position in the current track")
+    async def seek(self, ctx, position: str):
+        await ctx.defer()
+        player = self.players.get(ctx.guild.id)
+        if player is None or not player.current:
+            return await ctx.send(embed=discord.Embed(description="⚠️ Nothing is playing.", color=DEFAULT_COLOR))
+        seconds = parse_timestamp(position)
+        duration = player.current.duration
+        if seconds is None or not duration or seconds >= duration:
+            return await ctx.send(embed=discord.Embed(description="⚠️ Invalid position.", color=DEFAULT_COLOR))
+        if not await player.restart(seconds):
+            return await ctx.send(embed=discord.Embed(description="⚠️ The track changed before the seek; try again.", color=DEFAULT_COLOR))
+        await ctx.send(embed=discord.Embed(description=f"⏩ Jumped to {format_time(seconds)}.", color=DEFAULT_COLOR))
 
     # ----------------- PITCH / SPEED -----------------
-    @commands.command(name="pitch")
+    @commands.hybrid_command(name="pitch", description="Change the pitch (0.5 - 2.0)")
     async def pitch(self, ctx, value: float):
-        await ctx.send(embed=discord.Embed(description=f"⚠️ Pitch adjustment currently not implemented.", color=DEFAULT_COLOR))
+        await ctx.defer()
+        if not 0.5 <= value <= 2.0:
+            return await ctx.send(embed=discord.Embed(description="⚠️ Pitch must be between 0.5 and 2.0.", color=DEFAULT_COLOR))
+        player = self.get_player(ctx)
+        player.pitch = value
+        await player.restart()
+        await ctx.send(embed=discord.Embed(description=f"🎚 Pitch set to x{value:g}.", color=DEFAULT_COLOR))
 
-    @commands.command(name="speed")
+    @commands.hybrid_command(name="speed", description="Change the speed (0.5 - 2.0)")
     async def speed(self, ctx, value: float):
-        await ctx.send(embed=discord.Embed(description=f"⚠️ Speed adjustment currently not implemented.", color=DEFAULT_COLOR))
+        await ctx.defer()
+        if not 0.5 <= value <= 2.0:
+            return await ctx.send(embed=discord.Embed(description="⚠️ Speed must be between 0.5 and 2.0.", color=DEFAULT_COLOR))
+        player = self.get_player(ctx)
+        player.speed = value
+        await player.restart()
+        await ctx.send(embed=discord.Embed(description=f"⏩ Speed set to x{value:g}.", color=DEFAULT_COLOR))
 
     # ----------------- REMOVEDUPES -----------------
-    @commands.command(name="removedupes")
+    @commands.hybrid_command(name="removedupes", description="Remove duplicate songs from the queue")
     async def removedupes(self, ctx):
-        player = self.get_player(ctx)
-        qlist = list(player.queue._queue)
-        seen = set()
-        new_queue = []
-        for s in qlist:
-            if s.title not in seen:
-                seen.add(s.title)
-                new_queue.append(s)
-        player.queue._queue = asyncio.Queue()
-        for s in new_queue:
-            await player.queue.put(s)
+        player = self.players.get(ctx.guild.id)
+        if player:
+            player.cancel_prefetch(player.queue.dedupe())
+            player.np.update()
         await ctx.send(embed=discord.Embed(description="🗑 Removed duplicate songs from queue.", color=DEFAULT_COLOR))
 
+    # ----------------- RADIO -----------------
+    @commands.hybrid_group(name="radio", invoke_without_command=True, fallback="list", description="Shared 24/7 stations")
+    async def radio(self, ctx):
+        if not self.hubs:
+            return await ctx.send(embed=discord.Embed(description="📻 No stations are live. Start one with `?radio start <name>`.", color=DEFAULT_COLOR))
+        lines = []
+        for hub in self.hubs.values():
+            playing = f" - [{hub.current.title}]({hub.current.url})" if hub.current else ""
+            lines.append(f"**{hub.name}** ({len(hub.subscribers)} server(s)){playing}")
+        embed = discord.Embed(title="📻 Stations", description="\n".join(lines), color=DEFAULT_COLOR)
+        embed.set_footer(text="Made by Isho")
+        await ctx.send(embed=embed)
+
+    @radio.command(name="start", description="Turn this server's queue into a station")
+    async def radio_start(self, ctx, name: str):
+        await ctx.defer()
+        name = name.lower()
+        if ctx.author.voice is None:
+            return await ctx.send(embed=discord.Embed(description="⚠️ You must be in a voice channel.", color=DEFAULT_COLOR))
+        if name in self.hubs:
+            return await ctx.send(embed=discord.Embed(description=f"⚠️ Station **{name}** is already live.", color=DEFAULT_COLOR))
+        player = self.players.get(ctx.guild.id)
+        tracks = []
+        if player:
+            tracks = ([player.current.track] if player.current else []) + list(player.queue)
+        if not tracks:
+            return await ctx.send(embed=discord.Embed(description="⚠️ Queue is empty.", color=DEFAULT_COLOR))
+        if ctx.voice_client is None:
+            await ctx.author.voice.channel.connect()
+        hub = self.hubs[name] = BroadcastHub(self.bot, name, on_empty=self.close_hub, on_track=self.hub_track_changed)
+        hub.queue.extend(tracks)
+        player.queue.clear()
+        player.cancel_prefetch()
+        player.attach(hub)
+        await ctx.send(embed=discord.Embed(
+            description=f"📻 Station **{name}** is live with {len(tracks)} track(s). Other servers can tune in with `?radio join {name}`.",
+            color=DEFAULT_COLOR
+        ))
+
+    @radio.command(name="join", description="Tune in to a station")
+    async def radio_join(self, ctx, name: str):
+        await ctx.defer()
+        hub = self.hubs.get(name.lower())
+        if hub is None:
+            return await ctx.send(embed=discord.Embed(description=f"⚠️ No station called **{name}**.", color=DEFAULT_COLOR))
+        if ctx.author.voice is None:
+            return await ctx.send(embed=discord.Embed(description="⚠️ You must be in a voice channel.", color=DEFAULT_COLOR))
+        if ctx.voice_client is None:
+            await ctx.author.voice.channel.connect()
+        self.get_player(ctx).attach(hub)
+        await ctx.send(embed=discord.Embed(description=f"📻 Tuned in to **{hub.name}**.", color=DEFAULT_COLOR))
+
+    @radio.command(name="leave", description="Leave the station")
+    async def radio_leave(self, ctx):
+        player = self.players.get(ctx.guild.id)
+        if player is None or player.hub is None:
+            return await ctx.send(embed=discord.Embed(description="⚠️ Not tuned in to a station.", color=DEFAULT_COLOR))
+        player.detach()
+        await ctx.send(embed=discord.Embed(description="✅ Left the station.", color=DEFAULT_COLOR))
+
+    # ----------------- STATS -----------------
+    @commands.command(name="stats", hidden=True)
+    @commands.is_owner()
+    async def stats_command(self, ctx):
+        def ms(histogram, q):
+            value = histogram.percentile(q)
+            return "n/a" if value is None else f"{value * 1000:.0f} ms"
+
+        def hit_rate(cache):
+            hits = CACHE_LOOKUPS.value(cache=cache, result="hit")
+            total = hits + CACHE_LOOKUPS.value(cache=cache, result="miss")
+            return f"{hits / total:.0%} of {total}" if total else "n/a"
+
+        embed = discord.Embed(title="📊 Music Pipeline", color=DEFAULT_COLOR)
+        embed.add_field(name="Players", value=f"{len(self.players)} ({sum(1 for p in self.players.values() if p.current)} playing)")
+        embed.add_field(name="Stations", value=str(len(self.hubs)))
+        embed.add_field(name="ffmpeg processes", value=str(FFMPEG_PROCESSES.value()))
+        embed.add_field(name="Extraction p50/p95", value=f"{ms(EXTRACTION_SECONDS, 50)} / {ms(EXTRACTION_SECONDS, 95)}")
+        embed.add_field(name="First audio p50/p95", value=f"{ms(FIRST_AUDIO_SECONDS, 50)} / {ms(FIRST_AUDIO_SECONDS, 95)}")
+        embed.add_field(name="ffmpeg start p95", value=ms(FFMPEG_START_SECONDS, 95))
+        embed.add_field(name="Extraction cache", value=hit_rate("extraction"))
+        embed.add_field(name="Audio cache", value=hit_rate("audio"))
+        embed.add_field(name="Queued work", value=f"API: {executor_queue_depth()}, extraction: {extractor.waiting}")
+        embed.set_footer(text=f"Made by Isho | /metrics on port {METRICS_PORT}" if self.metrics_server else "Made by Isho")
+        await ctx.send(embed=embed)
+
+    # ----------------- PLAYER STATS -----------------
+    @commands.command(name="players", hidden=True)
+    @commands.is_owner()
+    async def players_command(self, ctx):
+        embed = discord.Embed(title="🎛 Music Players", color=DEFAULT_COLOR)
+        embed.add_field(name="Players", value=str(len(self.players)))
+        embed.add_field(name="Playing", value=str(sum(1 for p in self.players.values() if p.current)))
+        embed.add_field(name="Stations", value=str(len(self.hubs)))
+        embed.add_field(name="Prefetching", value=str(sum(len(p._resolving) for p in self.players.values())))
+        embed.add_field(name="Asyncio tasks", value=str(len(asyncio.all_tasks())))
+        embed.set_footer(text="Made by Isho")
+        await ctx.send(embed=embed)
+
 # ==========================
 # Cog Setup
 # ==========================
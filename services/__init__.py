@@ -0,0 +1,11 @@
+"""Shared service layers used by the cogs (kept out of cogs/ so the loader doesn't treat them as extensions)."""
+from .clients import SpotifyClient, GeniusClient, shutdown_executor, executor_queue_depth
+from .extraction_cache import ExtractionCache, stream_expiry, METADATA_KEYS
+from .extractor import ExtractionService, ExtractionError
+from .audio_cache import AudioCache
+from .log_pipeline import setup_logging
+from .metrics import REGISTRY, MetricsServer
+from .player_store import PlayerStore
+from .lyrics import LyricsService, split_pages
+from .rate_limit import CommandLimiter
+from .loudness import LoudnessService
@@ -0,0 +1,101 @@
+"""
+Size-bounded on-disk cache of played audio, keyed by video ID.
+
+ffmpeg writes the stream to a uniquely named .part file while it plays;
+the file is renamed into place (atomic on the same filesystem) only once
+playback reached the end. Least recently played files are evicted when the
+byte budget is exceeded. Leftover .part files are removed at startup.
+"""
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+
+SUFFIX = ".mka"
+VIDEO_ID_RE = re.compile(r"[A-Za-z0-9_-]+")
+
+class AudioCache:
+    def __init__(self, directory, *, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()  # video_id -> size, least recently used first
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _path(self, name):
+        # Forward slashes: the path ends up in an ffmpeg options string that discord.py shlex-splits
+        return os.path.join(self.directory, name).replace("\\", "/")
+
+    def _scan(self):
+        found = []
+        for name in os.listdir(self.directory):
+            path = self._path(name)
+            if name.endswith(".part"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            elif name.endswith(SUFFIX):
+                st = os.stat(path)
+                found.append((st.st_mtime, name[:-len(SUFFIX)], st.st_size))
+        for _, video_id, size in sorted(found):
+            self._entries[video_id] = size
+            self.total_bytes += size
+        with self._lock:
+            self._evict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, video_id):
+        """Returns the cached file for a video and marks it recently used, or None."""
+        with self._lock:
+            if video_id not in self._entries:
+                return None
+            self._entries.move_to_end(video_id)
+        path = self._path(video_id + SUFFIX)
+        try:
+            os.utime(path)  # keeps LRU order across restarts
+        except OSError:
+            with self._lock:
+                self.total_bytes -= self._entries.pop(video_id, 0)
+            return None
+        return path
+
+    def reserve(self, video_id):
+        """Returns a fresh .part path for ffmpeg to write, or None if this video shouldn't be cached."""
+        if not video_id or not VIDEO_ID_RE.fullmatch(video_id) or video_id in self._entries:
+            return None
+        return self._path(f"{video_id}.{uuid.uuid4().hex[:8]}.part")
+
+    def commit(self, video_id, part_path):
+        try:
+            size = os.path.getsize(part_path)
+            if size == 0:
+                raise OSError("empty cache file")
+            os.replace(part_path, self._path(video_id + SUFFIX))
+        except OSError:
+            self.discard(part_path)
+            return
+        with self._lock:
+            self.total_bytes += size - self._entries.pop(video_id, 0)
+            self._entries[video_id] = size
+            self._evict()
+
+    def discard(self, part_path):
+        try:
+            os.remove(part_path)
+        except OSError:
+            pass
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._entries:
+            video_id, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(video_id + SUFFIX))
+            except OSError:
+                pass
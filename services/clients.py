@@ -0,0 +1,126 @@
+"""
+Async wrappers around the blocking Spotify and Genius SDKs.
+
+spotipy and lyricsgenius are requests-based and synchronous. Every call is
+pushed onto one small dedicated thread pool (never the event loop, and not
+the default executor that yt-dlp uses) and bounded by a timeout.
+
+The SDKs are imported and their clients built on the first call, inside a
+pool thread, so neither startup nor the event loop pays for them.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .metrics import REGISTRY
+
+API_WORKERS = int(os.getenv("API_WORKERS", "4"))
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))
+
+_executor = None
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=API_WORKERS, thread_name_prefix="api")
+    return _executor
+
+def executor_queue_depth():
+    """Calls submitted to the API pool that no worker has picked up yet."""
+    return _executor._work_queue.qsize() if _executor is not None else 0
+
+API_SECONDS = REGISTRY.histogram("kz_api_call_seconds", "Spotify/Genius call time including executor wait", ("client",))
+REGISTRY.gauge("kz_api_executor_queue_depth", "API calls waiting for a worker thread", fn=executor_queue_depth)
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+class _BlockingClient:
+    def __init__(self, factory, *, timeout=API_TIMEOUT):
+        self._factory = factory
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.timeout = timeout
+
+    @property
+    def client(self):
+        """The SDK client, built on first access (blocking: imports the SDK)."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._factory()
+        return self._client
+
+    def _invoke(self, method, *args, **kwargs):
+        return getattr(self.client, method)(*args, **kwargs)
+
+    async def _call(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(get_executor(), functools.partial(self._invoke, method, *args, **kwargs))
+        with API_SECONDS.time(client=type(self).__name__):
+            return await asyncio.wait_for(future, self.timeout)
+
+# ==========================
+# Spotify
+# ==========================
+class SpotifyClient(_BlockingClient):
+    @classmethod
+    def from_env(cls):
+        client_id = os.getenv("SPOTIFY_CLIENT_ID")
+        client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+        if not client_id or not client_secret:
+            return None
+
+        def build():
+            import requests
+            import spotipy
+            from requests.adapters import HTTPAdapter
+            from spotipy.oauth2 import SpotifyClientCredentials
+
+            # One pooled session shared by all API worker threads
+            session = requests.Session()
+            session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=API_WORKERS))
+            return spotipy.Spotify(
+                auth_manager=SpotifyClientCredentials(client_id=client_id, client_secret=client_secret),
+                requests_session=session,
+                requests_timeout=API_TIMEOUT,
+            )
+        return cls(build)
+
+    async def track(self, track_id):
+        return await self._call("track", track_id)
+
+    async def artist_top_tracks(self, artist_id):
+        return await self._call("artist_top_tracks", artist_id)
+
+    async def playlist_tracks(self, playlist_id, *, limit=100, offset=0):
+        return await self._call("playlist_tracks", playlist_id, limit=limit, offset=offset)
+
+    async def album(self, album_id):
+        return await self._call("album", album_id)
+
+    async def album_tracks(self, album_id, *, limit=50, offset=0):
+        return await self._call("album_tracks", album_id, limit=limit, offset=offset)
+
+# ==========================
+# Genius
+# ==========================
+class GeniusClient(_BlockingClient):
+    @classmethod
+    def from_env(cls):
+        token = os.getenv("GENIUS_TOKEN")
+        if not token:
+            return None
+
+        def build():
+            import lyricsgenius
+            return lyricsgenius.Genius(token, timeout=int(API_TIMEOUT), retries=1, verbose=False)
+        return cls(build)
+
+    async def search_song(self, title, artist=""):
+        return await self._call("search_song", title, artist)
@@ -0,0 +1,43 @@
+"""
+Standalone yt-dlp worker process, spawned by services.extractor.
+
+Reads one JSON request per line on stdin and answers each with one JSON line
+on stdout. Run as a plain script (not via the package) so that starting a
+worker doesn't import discord or the other service clients.
+"""
+import json
+import sys
+
+import yt_dlp
+
+# Everything the bot reads from an info dict; the rest (formats, thumbnails, ...) stays in the worker
+KEEP_KEYS = (
+    "id", "title", "webpage_url", "duration", "thumbnail", "uploader",
+    "url", "ext", "acodec", "abr", "asr", "format_id", "is_live", "http_headers",
+)
+
+def extract(ytdl, query):
+    data = ytdl.extract_info(query, download=False)
+    if "entries" in data:
+        entries = [e for e in data["entries"] if e]
+        if not entries:
+            raise LookupError(f"No results for {query!r}")
+        data = entries[0]
+    return {k: data[k] for k in KEEP_KEYS if k in data}
+
+def main():
+    opts = json.loads(sys.argv[1])
+    out = sys.stdout
+    sys.stdout = sys.stderr  # keep any yt-dlp chatter off the protocol channel
+    ytdl = yt_dlp.YoutubeDL(opts)
+    for line in sys.stdin:
+        request = json.loads(line)
+        try:
+            reply = {"ok": True, "data": extract(ytdl, request["query"])}
+        except Exception as e:
+            reply = {"ok": False, "error": str(e)}
+        out.write(json.dumps(reply) + "\n")
+        out.flush()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Persistent SQLite cache for yt-dlp extraction results.
+
+Long-lived metadata (title, uploader, duration, thumbnail) is stored once per
+video ID. The stream URL sits next to it with its own expiry, so it can be
+refreshed without repeating the search. Normalized search strings and Spotify
+track IDs both map onto video IDs. Videos are evicted least-recently-used once
+the table grows past max_entries.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+YOUTUBE_ID_RE = re.compile(r"(?:youtube\.com/(?:watch\?(?:.*&)?v=|shorts/|embed/)|youtu\.be/)([A-Za-z0-9_-]{11})")
+METADATA_KEYS = ("id", "title", "webpage_url", "duration", "thumbnail", "uploader", "acodec", "ext", "is_live")
+# Treat stream URLs as expired a little before googlevideo actually rejects them
+EXPIRY_MARGIN = 300
+# Only run the eviction query every N writes
+EVICT_EVERY = 50
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    video_id TEXT PRIMARY KEY,
+    metadata TEXT NOT NULL,
+    stream_url TEXT,
+    stream_expires REAL NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS videos_last_used ON videos (last_used);
+CREATE TABLE IF NOT EXISTS queries (
+    query TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS spotify (
+    spotify_id TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL
+);
+"""
+
+def video_id_from_url(query):
+    match = YOUTUBE_ID_RE.search(query)
+    return match.group(1) if match else None
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+def stream_expiry(url, default_ttl):
+    """Reads the expire= timestamp googlevideo embeds in stream URLs, else falls back to a fixed TTL."""
+    try:
+        return float(parse_qs(urlparse(url).query)["expire"][0]) - EXPIRY_MARGIN
+    except (KeyError, IndexError, ValueError):
+        return time.time() + default_ttl
+
+class ExtractionCache:
+    def __init__(self, path, *, max_entries=5000):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ----------------- Lookups -----------------
+    def get(self, query):
+        """Returns cached info for a search string or video URL; includes "url" only while the stream is fresh."""
+        with self._lock:
+            video_id = video_id_from_url(query)
+            if video_id is None:
+                row = self._db.execute("SELECT video_id FROM queries WHERE query = ?", (normalize_query(query),)).fetchone()
+                if row is None:
+                    return None
+                video_id = row[0]
+            return self._load(video_id)
+
+    def get_spotify(self, spotify_id):
+        with self._lock:
+            row = self._db.execute("SELECT video_id FROM spotify WHERE spotify_id = ?", (spotify_id,)).fetchone()
+            return self._load(row[0]) if row else None
+
+    def _load(self, video_id):
+        row = self._db.execute(
+            "SELECT metadata, stream_url, stream_expires FROM videos WHERE video_id = ?", (video_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        self._db.execute("UPDATE videos SET last_used = ? WHERE video_id = ?", (now, video_id))
+        data = json.loads(row[0])
+        if row[1] and row[2] > now:
+            data["url"] = row[1]
+            data["expires_at"] = row[2]
+        return data
+
+    # ----------------- Writes -----------------
+    def put(self, query, data):
+        video_id = data.get("id")
+        if not video_id:
+            return
+        metadata = json.dumps({k: data.get(k) for k in METADATA_KEYS})
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO videos (video_id, metadata, stream_url, stream_expires, last_used) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(video_id) DO UPDATE SET metadata = excluded.metadata, stream_url = excluded.stream_url, "
+                "stream_expires = excluded.stream_expires, last_used = excluded.last_used",
+                (video_id, metadata, data.get("url"), data.get("expires_at") or 0, time.time())
+            )
+            if video_id_from_url(query) is None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO queries (query, video_id) VALUES (?, ?)", (normalize_query(query), video_id)
+                )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 0:
+                self._evict()
+
+    def put_spotify(self, spotify_id, video_id):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO spotify (spotify_id, video_id) VALUES (?, ?)", (spotify_id, video_id))
+
+    def _evict(self):
+        (count,) = self._db.execute("SELECT COUNT(*) FROM videos").fetchone()
+        if count <= self.max_entries:
+            return
+        self._db.execute(
+            "DELETE FROM videos WHERE video_id IN (SELECT video_id FROM videos ORDER BY last_used LIMIT ?)",
+            (count - self.max_entries,)
+        )
+        self._db.execute("DELETE FROM queries WHERE video_id NOT IN (SELECT video_id FROM videos)")
+        self._db.execute("DELETE FROM spotify WHERE video_id NOT IN (SELECT video_id FROM videos)")
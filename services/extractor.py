@@ -0,0 +1,133 @@
+"""
+Pool of yt-dlp worker processes.
+
+Each worker is a separate Python process with its own YoutubeDL instance, so
+the CPU-heavy parsing never competes with the event loop for the GIL. Callers
+wait for an idle worker in FIFO order. A request that times out, or whose
+caller is cancelled mid-extraction, gets its worker killed and replaced.
+"""
+import asyncio
+import json
+import logging
+import os
+import sys
+
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "2"))
+EXTRACT_TIMEOUT = float(os.getenv("EXTRACT_TIMEOUT", "30"))
+# Recycle workers after this many requests to bound yt-dlp's memory growth
+EXTRACT_MAX_REQUESTS = int(os.getenv("EXTRACT_MAX_REQUESTS", "500"))
+
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "extract_worker.py")
+
+log = logging.getLogger(__name__)
+
+class ExtractionError(Exception):
+    pass
+
+class _Worker:
+    def __init__(self, proc):
+        self.proc = proc
+        self.served = 0
+
+    @property
+    def alive(self):
+        return self.proc.returncode is None
+
+    async def request(self, query, timeout):
+        self.proc.stdin.write((json.dumps({"query": query}) + "\n").encode())
+        await self.proc.stdin.drain()
+        line = await asyncio.wait_for(self.proc.stdout.readline(), timeout)
+        if not line:
+            raise ConnectionError("Extraction worker exited unexpectedly")
+        self.served += 1
+        reply = json.loads(line)
+        if not reply["ok"]:
+            raise ExtractionError(reply["error"])
+        return reply["data"]
+
+    async def kill(self):
+        """Kills the process and reaps it, so no zombie (or unclosed-transport warning) is left behind."""
+        if self.alive:
+            self.proc.kill()
+        await self.proc.wait()
+
+class ExtractionService:
+    def __init__(self, ytdl_opts, *, workers=EXTRACT_WORKERS, timeout=EXTRACT_TIMEOUT, max_requests=EXTRACT_MAX_REQUESTS):
+        self.ytdl_opts = ytdl_opts
+        self.size = workers
+        self.timeout = timeout
+        self.max_requests = max_requests
+        self.waiting = 0
+        self._idle = None
+        self._workers = set()
+        self._start_lock = asyncio.Lock()
+
+    async def _spawn(self):
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, WORKER_SCRIPT, json.dumps(self.ytdl_opts),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            limit=2 ** 20,
+        )
+        worker = _Worker(proc)
+        self._workers.add(worker)
+        self._idle.put_nowait(worker)
+
+    async def _replace(self, worker):
+        self._workers.discard(worker)
+        try:
+            # Shielded: the old process is reaped before its replacement starts, even if this task is cancelled
+            await asyncio.shield(worker.kill())
+        except Exception:
+            log.exception("Failed to reap extraction worker")
+        try:
+            await self._spawn()
+        except Exception:
+            log.exception("Failed to respawn extraction worker")
+
+    async def start(self):
+        async with self._start_lock:
+            if self._idle is None:
+                self._idle = asyncio.Queue()
+                for _ in range(self.size):
+                    await self._spawn()
+
+    async def extract(self, query):
+        if self._idle is None:
+            await self.start()
+        self.waiting += 1
+        try:
+            worker = await self._idle.get()
+        finally:
+            self.waiting -= 1
+
+        try:
+            data = await worker.request(query, self.timeout)
+        except asyncio.TimeoutError:
+            log.warning("Extraction of %r timed out; recycling worker", query)
+            asyncio.create_task(self._replace(worker))
+            raise ExtractionError(f"Extraction timed out after {self.timeout:.0f}s")
+        except asyncio.CancelledError:
+            # The worker is still busy with the abandoned request; don't wait for it
+            asyncio.create_task(self._replace(worker))
+            raise
+        except ExtractionError:
+            # The worker answered; only this query failed
+            self._idle.put_nowait(worker)
+            raise
+        except Exception as e:
+            # Broken pipe, early exit or garbage on stdout: the worker is unusable
+            asyncio.create_task(self._replace(worker))
+            raise ExtractionError(f"Extraction worker failed: {e}") from e
+
+        if worker.served >= self.max_requests:
+            asyncio.create_task(self._replace(worker))
+        else:
+            self._idle.put_nowait(worker)
+        return data
+
+    async def close(self):
+        workers = list(self._workers)
+        self._workers.clear()
+        self._idle = None
+        await asyncio.gather(*(w.kill() for w in workers), return_exceptions=True)
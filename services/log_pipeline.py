@@ -0,0 +1,88 @@
+"""
+Non-blocking logging setup.
+
+Every logger writes into a QueueHandler, which only enqueues the record; a
+QueueListener thread does the formatting and file I/O. The file rotates by size
+(default) or at midnight, per-logger levels keep discord.py's gateway and voice
+chatter quiet while our own modules stay verbose, and LOG_JSON=1 switches the
+file to one JSON object per line.
+"""
+import json
+import logging
+import logging.handlers
+import os
+import queue
+
+LOG_FILE = os.getenv("LOG_FILE", "discord.log")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# Comma separated logger=LEVEL overrides, applied on top of the defaults below
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+# "size" rotates at LOG_MAX_BYTES, "time" rotates at midnight
+LOG_ROTATE = os.getenv("LOG_ROTATE", "size")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(5 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))
+LOG_JSON = os.getenv("LOG_JSON", "0") == "1"
+
+DEFAULT_LEVELS = {
+    "discord": "INFO",
+    "discord.gateway": "WARNING",
+    "discord.voice_state": "WARNING",
+    "discord.player": "WARNING",
+    "discord.http": "WARNING",
+    "cogs": "DEBUG",
+    "services": "DEBUG",
+}
+TEXT_FORMAT = "%(asctime)s:%(levelname)s:%(name)s: %(message)s"
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; exceptions go into an "exc" field."""
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def parse_levels(spec):
+    """"discord.gateway=WARNING,cogs=DEBUG" -> {"discord.gateway": "WARNING", "cogs": "DEBUG"}"""
+    levels = {}
+    for item in spec.split(","):
+        name, sep, level = item.partition("=")
+        if sep and name.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def _file_handler():
+    if LOG_ROTATE == "time":
+        return logging.handlers.TimedRotatingFileHandler(
+            LOG_FILE, when="midnight", backupCount=LOG_BACKUPS, encoding="utf-8")
+    return logging.handlers.RotatingFileHandler(
+        LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS, encoding="utf-8")
+
+
+def setup_logging():
+    """Installs the queue pipeline on the root logger and returns the started listener (stop() it on exit)."""
+    handler = _file_handler()
+    handler.setFormatter(JsonFormatter() if LOG_JSON else logging.Formatter(TEXT_FORMAT))
+
+    records = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(logging.handlers.QueueHandler(records))
+    root.setLevel(LOG_LEVEL.upper())
+    for name, level in {**DEFAULT_LEVELS, **parse_levels(LOG_LEVELS)}.items():
+        logging.getLogger(name).setLevel(level)
+
+    listener.start()
+    return listener
@@ -0,0 +1,144 @@
+"""
+Per-video loudness measurements for volume normalization.
+
+Each video is measured once: ffmpeg's loudnorm filter runs in analysis mode
+over the whole track in a subprocess (never on the event loop) and reports
+integrated loudness and true peak. The measurements are stored by video ID in
+SQLite; the gain is derived from them at lookup time, so changing the target
+doesn't require measuring again. Playback applies the gain as an ffmpeg
+volume filter, or not at all when it is within UNITY_DB of 0 dB.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from .metrics import REGISTRY
+
+log = logging.getLogger(__name__)
+
+# Gains closer to 0 dB than this are not applied (keeps Opus passthrough)
+UNITY_DB = float(os.getenv("LOUDNESS_UNITY_DB", "1.0"))
+MAX_BOOST_DB = float(os.getenv("LOUDNESS_MAX_BOOST_DB", "10"))
+# Headroom kept below 0 dBTP when boosting quiet tracks
+PEAK_CEILING = -1.0
+ANALYSIS_TIMEOUT = float(os.getenv("LOUDNESS_ANALYSIS_TIMEOUT", "180"))
+
+ANALYSIS_SECONDS = REGISTRY.histogram("kz_loudness_analysis_seconds", "ffmpeg loudness analysis time per track",
+                                      buckets=(1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 180.0))
+ANALYSES = REGISTRY.counter("kz_loudness_analyses_total", "Loudness analyses by outcome", ("result",))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS loudness (
+    video_id TEXT PRIMARY KEY,
+    integrated REAL,
+    true_peak REAL,
+    measured_at REAL NOT NULL
+);
+"""
+
+def parse_loudnorm(stderr):
+    """(integrated LUFS, true peak dBTP) from loudnorm's print_format=json report; None for silence."""
+    start = stderr.rfind("{")
+    report = json.loads(stderr[start:stderr.rfind("}") + 1])
+    integrated, peak = float(report["input_i"]), float(report["input_tp"])
+    if integrated == float("-inf"):
+        return None
+    return integrated, peak
+
+class LoudnessService:
+    def __init__(self, ffmpeg, path, *, target=-14.0, concurrency=1):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.ffmpeg = ffmpeg
+        self.target = target
+        self._sem = asyncio.Semaphore(concurrency)
+        self._inflight = {}  # video_id -> Task
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        for task in list(self._inflight.values()):
+            task.cancel()
+        with self._lock:
+            self._db.close()
+
+    # ----------------- Lookups -----------------
+    def measured(self, video_id):
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM loudness WHERE video_id = ?", (video_id,)).fetchone() is not None
+
+    def gain_db(self, video_id):
+        """Gain that brings the video to the target loudness, or None if it wasn't measured (or is silent)."""
+        with self._lock:
+            row = self._db.execute("SELECT integrated, true_peak FROM loudness WHERE video_id = ?", (video_id,)).fetchone()
+        if row is None or row[0] is None:
+            return None
+        integrated, peak = row
+        # Turning down is always safe; boosting stops at the boost cap and the peak ceiling
+        gain = self.target - integrated
+        if gain > 0:
+            gain = max(0.0, min(gain, MAX_BOOST_DB, PEAK_CEILING - peak))
+        return gain
+
+    def gain(self, video_id):
+        """Linear gain factor for playback; 1.0 when unmeasured or close enough to unity."""
+        gain = self.gain_db(video_id) if video_id else None
+        if gain is None or abs(gain) < UNITY_DB:
+            return 1.0
+        return 10 ** (gain / 20)
+
+    # ----------------- Analysis -----------------
+    def analyze(self, video_id, source, *, before_options=()):
+        """Measures a video in the background unless it already was or is being measured. Returns the task or None."""
+        if not video_id or video_id in self._inflight or self.measured(video_id):
+            return None
+        task = self._inflight[video_id] = asyncio.ensure_future(self._analyze(video_id, source, before_options))
+        task.add_done_callback(lambda t: self._analysis_done(video_id, t))
+        return task
+
+    def _analysis_done(self, video_id, task):
+        self._inflight.pop(video_id, None)
+        if not task.cancelled() and task.exception():
+            log.debug("Loudness analysis of %s aborted: %r", video_id, task.exception())
+
+    async def _analyze(self, video_id, source, before_options):
+        args = [self.ffmpeg, "-hide_banner", "-nostats", *before_options, "-i", source,
+                "-vn", "-af", "loudnorm=print_format=json", "-f", "null", "-"]
+        async with self._sem:
+            started = time.perf_counter()
+            proc = await asyncio.create_subprocess_exec(
+                *args, stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+            )
+            try:
+                _, stderr = await asyncio.wait_for(proc.communicate(), ANALYSIS_TIMEOUT)
+            except BaseException:
+                # Timed out or cancelled (cog unload): don't leave ffmpeg downloading in the background
+                if proc.returncode is None:
+                    proc.kill()
+                ANALYSES.inc(result="aborted")
+                raise
+            ANALYSIS_SECONDS.observe(time.perf_counter() - started)
+        if proc.returncode != 0:
+            ANALYSES.inc(result="error")
+            log.debug("Loudness analysis of %s failed (exit %s)", video_id, proc.returncode)
+            return
+        try:
+            measured = parse_loudnorm(stderr.decode("utf-8", "replace"))
+        except (ValueError, KeyError) as e:
+            ANALYSES.inc(result="error")
+            log.debug("Unreadable loudnorm report for %s: %s", video_id, e)
+            return
+        integrated, peak = measured or (None, None)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO loudness (video_id, integrated, true_peak, measured_at) VALUES (?, ?, ?, ?)",
+                (video_id, integrated, peak, time.time())
+            )
+        ANALYSES.inc(result="ok")
@@ -0,0 +1,141 @@
+"""
+Cached Genius lyrics lookups.
+
+Results are keyed by a normalized title/artist pair and kept in a small
+in-memory LRU in front of an SQLite table, so restarts don't repeat searches.
+Misses are cached too, for NEGATIVE_TTL, so a song Genius doesn't know isn't
+searched again on every ?lyrics. Concurrent requests for the same key share one
+search, which lets the player prefetch lyrics when a track starts while a user
+asks for them at the same moment.
+"""
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+log = logging.getLogger(__name__)
+
+NEGATIVE_TTL = int(os.getenv("LYRICS_NEGATIVE_TTL", str(6 * 60 * 60)))
+# Discord allows 4096 characters in an embed description
+PAGE_LIMIT = 4000
+# "(Official Video)", "[Lyrics]", "ft. X" and similar YouTube title noise
+NOISE_RE = re.compile(r"[\(\[][^\)\]]*[\)\]]|\b(?:ft|feat)\.?\s.*$|\bofficial\b.*$|\blyrics?\b", re.IGNORECASE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lyrics (
+    key TEXT PRIMARY KEY,
+    title TEXT,
+    lyrics TEXT,
+    fetched_at REAL NOT NULL
+);
+"""
+
+Lyrics = namedtuple("Lyrics", "title text")
+
+def lyrics_key(title, artist=""):
+    title = NOISE_RE.sub(" ", title)
+    return " ".join(f"{title} {artist}".lower().split())
+
+def split_pages(text, limit=PAGE_LIMIT):
+    """Splits lyrics on line boundaries into chunks of at most `limit` characters."""
+    pages, current = [], ""
+    for line in text.splitlines(keepends=True):
+        if current and len(current) + len(line) > limit:
+            pages.append(current)
+            current = ""
+        while len(line) > limit:
+            pages.append(line[:limit])
+            line = line[limit:]
+        current += line
+    if current.strip():
+        pages.append(current)
+    return pages or [""]
+
+class LyricsService:
+    def __init__(self, genius, path, *, max_memory=256):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.genius = genius
+        self.max_memory = max_memory
+        self._memory = OrderedDict()  # key -> (Lyrics or None for a cached miss, fetched_at)
+        self._inflight = {}  # key -> Task
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # ----------------- Cache -----------------
+    def cached(self, title, artist=""):
+        """(hit, Lyrics or None) without any network; a hit with None is a remembered miss."""
+        key = lyrics_key(title, artist)
+        entry = self._memory.get(key)
+        if entry is not None:
+            result, fetched_at = entry
+            if result is not None or fetched_at >= time.time() - NEGATIVE_TTL:
+                self._memory.move_to_end(key)
+                return True, result
+            del self._memory[key]  # expired miss: the row below is just as old, so this ends in a new search
+        with self._lock:
+            row = self._db.execute("SELECT title, lyrics, fetched_at FROM lyrics WHERE key = ?", (key,)).fetchone()
+        if row is None or (row[1] is None and row[2] < time.time() - NEGATIVE_TTL):
+            return False, None
+        result = Lyrics(row[0], row[1]) if row[1] is not None else None
+        self._remember(key, result, row[2])
+        return True, result
+
+    def _remember(self, key, result, fetched_at):
+        self._memory[key] = (result, fetched_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def _store(self, key, result):
+        now = time.time()
+        self._remember(key, result, now)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO lyrics (key, title, lyrics, fetched_at) VALUES (?, ?, ?, ?)",
+                (key, result.title if result else None, result.text if result else None, now)
+            )
+
+    # ----------------- Lookups -----------------
+    async def get(self, title, artist=""):
+        """Lyrics for a song, or None if Genius has none. Network errors propagate and are not cached."""
+        hit, result = self.cached(title, artist)
+        if hit:
+            return result
+        key = lyrics_key(title, artist)
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(self._fetch(key, title, artist))
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one caller giving up must not cancel the search for the others
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key, title, artist):
+        # Genius matches the bare song title far better than a YouTube video title
+        song = await self.genius.search_song(" ".join(NOISE_RE.sub(" ", title).split()) or title, artist)
+        result = Lyrics(song.title, song.lyrics) if song and song.lyrics else None
+        self._store(key, result)
+        return result
+
+    def prefetch(self, title, artist=""):
+        """Starts a background lookup unless the answer is already cached."""
+        if self.cached(title, artist)[0]:
+            return
+        task = asyncio.ensure_future(self.get(title, artist))
+        task.add_done_callback(self._prefetch_done)
+
+    @staticmethod
+    def _prefetch_done(task):
+        if not task.cancelled() and task.exception():
+            log.debug("Lyrics prefetch failed: %s", task.exception())
@@ -0,0 +1,184 @@
+"""
+In-process metrics with a Prometheus text endpoint.
+
+Counters, gauges and histograms live in one module-level REGISTRY. Updates are
+a lock plus a dict write, cheap enough for the audio threads. Gauges can also
+be backed by a callback that is evaluated at scrape time. Histograms keep a
+small window of recent samples next to the buckets so ?stats can show
+percentiles without a Prometheus server. The HTTP endpoint runs on the bot's
+own event loop through aiohttp, which discord.py already depends on.
+"""
+import bisect
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from aiohttp import web
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RECENT_SAMPLES = 512
+
+
+def _label_str(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, doc, labels=()):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, "")) for n in self.labels)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_label_str(self.labels, k)} {v}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def __init__(self, name, doc, labels=(), *, fn=None):
+        super().__init__(name, doc, labels)
+        self.fn = fn
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def value(self, **labels):
+        return self.fn() if self.fn else super().value(**labels)
+
+    def render(self):
+        if self.fn:
+            return self.header() + [f"{self.name} {self.fn()}"]
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), *, buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+            self.recent.append(value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def percentile(self, q):
+        """q-th percentile (0-100) of the recent window across all labels; None without samples."""
+        samples = sorted(self.recent)
+        if not samples:
+            return None
+        return samples[min(int(len(samples) * q / 100), len(samples) - 1)]
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            items = [(k, list(c), t) for k, (c, t) in self._values.items()]
+        for key, counts, total in items:
+            running = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                running += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, [('le', le)])} {running}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {running}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _add(self, metric):
+        # Re-registering (cog reload) hands back the existing metric so its values survive
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, doc, labels=()):
+        return self._add(Counter(name, doc, labels))
+
+    def gauge(self, name, doc, labels=(), *, fn=None):
+        gauge = self._add(Gauge(name, doc, labels, fn=fn))
+        if fn is not None:
+            gauge.fn = fn
+        return gauge
+
+    def histogram(self, name, doc, labels=(), *, buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, doc, labels, buckets=buckets))
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class MetricsServer:
+    """GET /metrics on a local port; start() and stop() from the event loop."""
+    def __init__(self, host, port, registry=REGISTRY):
+        self.host = host
+        self.port = port
+        self.registry = registry
+        self._runner = None
+
+    async def _handle(self, request):
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
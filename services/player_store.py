@@ -0,0 +1,80 @@
+"""
+SQLite snapshots of music player state, for resuming after a restart.
+
+One row per guild: where the bot was (voice and text channel), the player
+settings, the playback offset and the queue as plain track descriptors. No
+stream URLs and no sources are stored. The queue column is only rewritten when
+the queue actually changed; the periodic snapshot of a playing guild otherwise
+touches just the small state columns.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS players (
+    guild_id INTEGER PRIMARY KEY,
+    voice_channel_id INTEGER NOT NULL,
+    text_channel_id INTEGER NOT NULL,
+    state TEXT NOT NULL,
+    queue TEXT NOT NULL DEFAULT '[]',
+    saved_at REAL NOT NULL
+);
+"""
+
+class PlayerStore:
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def save(self, guild_id, *, voice_channel_id, text_channel_id, state, queue=None):
+        """Upserts a guild's snapshot. With queue=None the stored queue is kept as it is."""
+        now = time.time()
+        with self._lock:
+            if queue is None:
+                cur = self._db.execute(
+                    "UPDATE players SET voice_channel_id = ?, text_channel_id = ?, state = ?, saved_at = ? WHERE guild_id = ?",
+                    (voice_channel_id, text_channel_id, json.dumps(state), now, guild_id)
+                )
+                if cur.rowcount:
+                    return
+                queue = []
+            self._db.execute(
+                "INSERT OR REPLACE INTO players (guild_id, voice_channel_id, text_channel_id, state, queue, saved_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (guild_id, voice_channel_id, text_channel_id, json.dumps(state), json.dumps(queue), now)
+            )
+
+    def delete(self, guild_id):
+        with self._lock:
+            self._db.execute("DELETE FROM players WHERE guild_id = ?", (guild_id,))
+
+    def load_all(self, max_age=None):
+        """Returns every snapshot as a dict, dropping ones older than max_age seconds."""
+        with self._lock:
+            if max_age is not None:
+                self._db.execute("DELETE FROM players WHERE saved_at < ?", (time.time() - max_age,))
+            rows = self._db.execute(
+                "SELECT guild_id, voice_channel_id, text_channel_id, state, queue FROM players"
+            ).fetchall()
+        return [
+            {
+                "guild_id": guild_id,
+                "voice_channel_id": voice_channel_id,
+                "text_channel_id": text_channel_id,
+                "state": json.loads(state),
+                "queue": json.loads(queue),
+            }
+            for guild_id, voice_channel_id, text_channel_id, state, queue in rows
+        ]
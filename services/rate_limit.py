@@ -0,0 +1,78 @@
+"""
+Token-bucket admission control for prefix commands.
+
+Every command costs tokens from two buckets, the author's and the guild's, and
+runs only if both can pay. Buckets refill continuously, so a short burst is
+fine but sustained spam is throttled. Rejections are coalesced: a key gets at
+most one "slow down" reply per reply window, and further rejected messages are
+dropped silently. Everything runs on the event loop and is O(1) per message.
+"""
+import time
+
+class TokenBuckets:
+    """One bucket per key, refilling at `rate` tokens/s up to `burst`. Full buckets are forgotten."""
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}  # key -> (tokens, updated_at)
+
+    def _level(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.burst, now))
+        return min(self.burst, tokens + (now - updated) * self.rate)
+
+    def wait(self, key, cost, now):
+        """Seconds until `cost` tokens are available; 0 if they are now."""
+        missing = min(cost, self.burst) - self._level(key, now)
+        return max(0.0, missing / self.rate)
+
+    def take(self, key, cost, now):
+        self._buckets[key] = (self._level(key, now) - min(cost, self.burst), now)
+
+    def prune(self, now):
+        """Drops buckets that have refilled completely; they behave exactly like new ones."""
+        full_after = self.burst / self.rate
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < full_after}
+
+    def __len__(self):
+        return len(self._buckets)
+
+class CommandLimiter:
+    PRUNE_EVERY = 1000
+
+    def __init__(self, *, user_rate, user_burst, guild_rate, guild_burst, reply_window):
+        self.users = TokenBuckets(user_rate, user_burst)
+        self.guilds = TokenBuckets(guild_rate, guild_burst)
+        self.reply_window = reply_window
+        self._replied = {}  # (scope, key) -> monotonic time of the last rejection reply
+        self._checks = 0
+        self.rejected = 0
+
+    def check(self, user_id, guild_id, cost=1):
+        """None if the command may run (tokens are taken), else (retry_after, scope) with scope "user" or "guild"."""
+        now = time.monotonic()
+        self._checks += 1
+        if self._checks % self.PRUNE_EVERY == 0:
+            self._prune(now)
+        user_wait = self.users.wait(user_id, cost, now)
+        guild_wait = self.guilds.wait(guild_id, cost, now) if guild_id else 0.0
+        if user_wait or guild_wait:
+            self.rejected += 1
+            return (user_wait, "user") if user_wait >= guild_wait else (guild_wait, "guild")
+        self.users.take(user_id, cost, now)
+        if guild_id:
+            self.guilds.take(guild_id, cost, now)
+        return None
+
+    def should_reply(self, scope, key):
+        """True for the first rejection of a key in each reply window."""
+        now = time.monotonic()
+        last = self._replied.get((scope, key))
+        if last is not None and now - last < self.reply_window:
+            return False
+        self._replied[(scope, key)] = now
+        return True
+
+    def _prune(self, now):
+        self.users.prune(now)
+        self.guilds.prune(now)
+        self._replied = {k: t for k, t in self._replied.items() if now - t < self.reply_window}